@@ -219,7 +219,6 @@ def go_back():
         st.session_state.current_q -= 1
         if st.session_state.answers:
             st.session_state.answers.pop()
-    st.rerun()
 
 def reset_survey():
     for key in list(st.session_state.keys()):
@@ -318,6 +317,104 @@ elif q_idx == 8 and not st.session_state.intro_2_seen:
 # === END CONTEXT PAGES ===
 
 
+# E. SCENARIO RENDERER
+def render_compact(title, time, display_text, col_key, label_base, context, s_id, green=False, express=False, dist=None):
+    
+    icon = "⚡" if express else ""
+    meta_html = f"<span>⏱️ {time}</span>"
+    if dist: meta_html += f" <span class='badge-dist'>📍 {dist}</span>"
+    if green: meta_html += f" <span class='badge-green'>🌿 Fossil Free</span>"
+    
+    def format_pay_text(txt):
+        clean_txt = str(txt).lower().replace("sek", "").replace("pay", "").strip()
+        if "free" in clean_txt or clean_txt == "0":
+            return "✅ FREE"
+        else:
+            return f"Pay for delivery fee {clean_txt} SEK"
+
+    pay_btn = None
+    topup_btn = None
+    
+    if " or Add " in display_text:
+        pay_txt, add_txt = display_text.split(" or ")
+        val = add_txt.replace("Add ", "")
+        pay_btn = format_pay_text(pay_txt)
+        topup_btn = f"Add {val} to cart for free shipping" 
+    else:
+        pay_btn = format_pay_text(display_text)
+
+    with st.container():
+        st.markdown('<div class="option-row">', unsafe_allow_html=True)
+        c1, c2 = st.columns([1.4, 1.2], gap="small") 
+        
+        with c1:
+            st.markdown(f"""
+                <div class="opt-title">{icon} {title}</div>
+                <div class="opt-meta">{meta_html}</div>
+            """, unsafe_allow_html=True)
+        
+        # The answer is stored in the click callback; the fragment rerun then shows the next scenario
+        with c2:
+            if topup_btn:
+                st.button(topup_btn, key=f"add_{col_key}", type="primary", use_container_width=True,
+                          on_click=submit_answer, args=(f"{label_base}_TOPUP", s_id, context))
+                st.button(pay_btn, key=f"pay_{col_key}", type="primary", use_container_width=True,
+                          on_click=submit_answer, args=(f"{label_base}_PAID", s_id, context))
+            else:
+                st.button(pay_btn, key=f"std_{col_key}", type="primary", use_container_width=True,
+                          on_click=submit_answer, args=(f"{label_base}_FLAT", s_id, context))
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# A click inside the fragment reruns only the fragment (header + options); the CSS
+# block, the state setup and the page chrome above are not run or sent again.
+@st.fragment
+def scenario_panel():
+    q_idx = st.session_state.current_q
+    if q_idx >= len(df) or (q_idx == 8 and not st.session_state.intro_2_seen):
+        # The context page of part 2 and the demographics page live outside the fragment
+        st.rerun()
+
+    row = df.iloc[q_idx]
+    cart_val = row['Context_Cart_Value']
+    home_disp = clean_display_text(row['Home_Display'], cart_val)
+    
+    # Attributes
+    home_green = is_true(row['Home_Is_Green']) if 'Home_Is_Green' in df.columns else False
+    locker_green = is_true(row['Locker_Is_Green']) if 'Locker_Is_Green' in df.columns else False
+    shop_green = is_true(row['Shop_Is_Green']) if 'Shop_Is_Green' in df.columns else False
+
+    # 1. FIXED HEADER
+    st.markdown(f"""
+    <div class="sticky-header">
+        <span class="header-text">🛒 Cart: {cart_val} SEK</span>
+        <span class="header-sub">Step {q_idx + 1}/{len(df)}</span>
+    </div>
+    <div class="header-spacer"></div>
+    """, unsafe_allow_html=True)
+    
+    # 2. RENDER ALL OPTIONS
+    render_compact("Standard Home", "2-4 Days", home_disp, f"h_std_{q_idx}", "Home_Standard", row['Context_Label'], row['Scenario_ID'], green=home_green)
+    render_compact("Express Home", "Next Day", row['Home_Exp_Display'], f"h_exp_{q_idx}", "Home_Express", row['Context_Label'], row['Scenario_ID'], express=True)
+    
+    l_dist = row['Locker_Distance'] if 'Locker_Distance' in row else None
+    render_compact("Parcel Locker", "2-4 Days", row['Locker_Display'], f"l_std_{q_idx}", "Locker_Standard", row['Context_Label'], row['Scenario_ID'], green=locker_green, dist=l_dist)
+    
+    render_compact("Express Locker", "Next Day", row['Locker_Exp_Display'], f"l_exp_{q_idx}", "Locker_Express", row['Context_Label'], row['Scenario_ID'], express=True, dist=l_dist)
+    
+    s_dist = row['Shop_Distance'] if 'Shop_Distance' in row else None
+    render_compact("Store Collect", "2-4 Days", row['Shop_Display'], f"s_col_{q_idx}", "Shop_Collect", row['Context_Label'], row['Scenario_ID'], green=shop_green, dist=s_dist)
+
+    # 3. NAVIGATION ROW (At Bottom)
+    st.markdown("<div style='margin-top: 5px;'></div>", unsafe_allow_html=True)
+    nav_col1, nav_col2 = st.columns([1, 4])
+    with nav_col1:
+        if q_idx > 0:
+            st.button("⬅️ Back", on_click=go_back, key="nav_back", use_container_width=True, type="secondary")
+    with nav_col2:
+        if st.button("Start Over", key="nav_reset", type="secondary"):
+            reset_survey()
+
+
 # D. DEMOGRAPHICS (At End)
 if q_idx >= len(df):
     if not st.session_state.data_saved:
@@ -375,93 +472,4 @@ if q_idx >= len(df):
             reset_survey()
 
 else:
-    # E. SCENARIO RENDERER
-    row = df.iloc[q_idx]
-    cart_val = row['Context_Cart_Value']
-    home_disp = clean_display_text(row['Home_Display'], cart_val)
-    
-    # Attributes
-    home_green = is_true(row['Home_Is_Green']) if 'Home_Is_Green' in df.columns else False
-    locker_green = is_true(row['Locker_Is_Green']) if 'Locker_Is_Green' in df.columns else False
-    shop_green = is_true(row['Shop_Is_Green']) if 'Shop_Is_Green' in df.columns else False
-
-    # 1. FIXED HEADER
-    st.markdown(f"""
-    <div class="sticky-header">
-        <span class="header-text">🛒 Cart: {cart_val} SEK</span>
-        <span class="header-sub">Step {q_idx + 1}/{len(df)}</span>
-    </div>
-    <div class="header-spacer"></div>
-    """, unsafe_allow_html=True)
-    
-    # 2. OPTIONS RENDERER
-    def render_compact(title, time, display_text, col_key, label_base, context, s_id, green=False, express=False, dist=None):
-        
-        icon = "⚡" if express else ""
-        meta_html = f"<span>⏱️ {time}</span>"
-        if dist: meta_html += f" <span class='badge-dist'>📍 {dist}</span>"
-        if green: meta_html += f" <span class='badge-green'>🌿 Fossil Free</span>"
-        
-        def format_pay_text(txt):
-            clean_txt = str(txt).lower().replace("sek", "").replace("pay", "").strip()
-            if "free" in clean_txt or clean_txt == "0":
-                return "✅ FREE"
-            else:
-                return f"Pay for delivery fee {clean_txt} SEK"
-
-        pay_btn = None
-        topup_btn = None
-        
-        if " or Add " in display_text:
-            pay_txt, add_txt = display_text.split(" or ")
-            val = add_txt.replace("Add ", "")
-            pay_btn = format_pay_text(pay_txt)
-            topup_btn = f"Add {val} to cart for free shipping" 
-        else:
-            pay_btn = format_pay_text(display_text)
-
-        with st.container():
-            st.markdown('<div class="option-row">', unsafe_allow_html=True)
-            c1, c2 = st.columns([1.4, 1.2], gap="small") 
-            
-            with c1:
-                st.markdown(f"""
-                    <div class="opt-title">{icon} {title}</div>
-                    <div class="opt-meta">{meta_html}</div>
-                """, unsafe_allow_html=True)
-            
-            with c2:
-                if topup_btn:
-                    if st.button(topup_btn, key=f"add_{col_key}", type="primary", use_container_width=True):
-                        submit_answer(f"{label_base}_TOPUP", s_id, context)
-                        st.rerun()
-                    if st.button(pay_btn, key=f"pay_{col_key}", type="primary", use_container_width=True):
-                        submit_answer(f"{label_base}_PAID", s_id, context)
-                        st.rerun()
-                else:
-                    if st.button(pay_btn, key=f"std_{col_key}", type="primary", use_container_width=True):
-                        submit_answer(f"{label_base}_FLAT", s_id, context)
-                        st.rerun()
-            st.markdown('</div>', unsafe_allow_html=True)
-
-    # RENDER ALL OPTIONS
-    render_compact("Standard Home", "2-4 Days", home_disp, f"h_std_{q_idx}", "Home_Standard", row['Context_Label'], row['Scenario_ID'], green=home_green)
-    render_compact("Express Home", "Next Day", row['Home_Exp_Display'], f"h_exp_{q_idx}", "Home_Express", row['Context_Label'], row['Scenario_ID'], express=True)
-    
-    l_dist = row['Locker_Distance'] if 'Locker_Distance' in row else None
-    render_compact("Parcel Locker", "2-4 Days", row['Locker_Display'], f"l_std_{q_idx}", "Locker_Standard", row['Context_Label'], row['Scenario_ID'], green=locker_green, dist=l_dist)
-    
-    render_compact("Express Locker", "Next Day", row['Locker_Exp_Display'], f"l_exp_{q_idx}", "Locker_Express", row['Context_Label'], row['Scenario_ID'], express=True, dist=l_dist)
-    
-    s_dist = row['Shop_Distance'] if 'Shop_Distance' in row else None
-    render_compact("Store Collect", "2-4 Days", row['Shop_Display'], f"s_col_{q_idx}", "Shop_Collect", row['Context_Label'], row['Scenario_ID'], green=shop_green, dist=s_dist)
-
-    # 3. NAVIGATION ROW (At Bottom)
-    st.markdown("<div style='margin-top: 5px;'></div>", unsafe_allow_html=True)
-    nav_col1, nav_col2 = st.columns([1, 4])
-    with nav_col1:
-        if q_idx > 0:
-            st.button("⬅️ Back", on_click=go_back, key="nav_back", use_container_width=True, type="secondary")
-    with nav_col2:
-        if st.button("Start Over", key="nav_reset", type="secondary"):
-            reset_survey()
+    scenario_panel()
@@ -0,0 +1,87 @@
+"""
+Benchmark: per-session design DataFrames vs. the shared DesignRegistry.
+
+Simulates N survey sessions starting with the same design CSV:
+
+    per-session   pd.read_csv() on every start, the frame kept in the session
+    shared        DesignRegistry.load_csv(): parsed once, the session keeps a key
+
+and reports the start latency (mean / p95) and the memory the sessions
+retain per session (tracemalloc plus the Arrow memory pool; the shared
+design is included, spread over all sessions). Larger designs are made by
+repeating the rows of the CSV.
+
+Run from the repo root:
+    python -m benchmarks.bench_design_store
+    python -m benchmarks.bench_design_store --sessions 500 --rows 16 2000 --csv shipping_topup_design_2.csv
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from survey_runtime import DesignRegistry
+
+try:
+    import pyarrow as pa
+except ImportError:  # pandas then keeps strings as Python objects, which tracemalloc sees
+    pa = None
+
+
+def _arrow_bytes():
+    """Bytes held by the Arrow memory pool (pandas' string columns live there, outside tracemalloc)."""
+    return pa.total_allocated_bytes() if pa is not None else 0
+
+
+def make_csv(path, n_rows):
+    """CSV bytes of the design at `path`, rows repeated up to `n_rows` scenarios."""
+    design = pd.read_csv(path)
+    design = design.iloc[np.arange(n_rows) % len(design)].reset_index(drop=True)
+    design["Scenario_ID"] = np.arange(1, n_rows + 1)
+    return design.to_csv(index=False).encode("utf-8")
+
+
+def per_session_start(data, registry):
+    return {"current_q": 0, "answers": [], "design_df": pd.read_csv(io.BytesIO(data))}
+
+
+def shared_start(data, registry):
+    return {"current_q": 0, "answers": [], "design_key": registry.load_csv(data)}
+
+
+def simulate(start_session, data, n_sessions):
+    """(start latencies in seconds, bytes retained per session) of n_sessions session starts."""
+    registry = DesignRegistry()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0] + _arrow_bytes()
+    sessions, latencies = [], []
+    for _ in range(n_sessions):
+        start = time.perf_counter()
+        sessions.append(start_session(data, registry))
+        latencies.append(time.perf_counter() - start)
+    retained = tracemalloc.get_traced_memory()[0] + _arrow_bytes() - before
+    tracemalloc.stop()
+    return np.array(latencies), retained / n_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="shipping_topup_design_2.csv")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--rows", type=int, nargs="+", default=[16, 2_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'mode':<12} {'mean start (ms)':>16} {'p95 start (ms)':>15} {'KB / session':>13}")
+    for n_rows in args.rows:
+        data = make_csv(args.csv, n_rows)
+        for name, start_session in [("per-session", per_session_start), ("shared", shared_start)]:
+            latencies, per_session = simulate(start_session, data, args.sessions)
+            print(f"{n_rows:>6} {name:<12} {latencies.mean() * 1e3:>16.3f} "
+                  f"{np.percentile(latencies, 95) * 1e3:>15.3f} {per_session / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: row-wise apply() offer logic vs. the vectorized offer engine.
+
+Run from the repo root:
+    python -m benchmarks.bench_offer_engine
+    python -m benchmarks.bench_offer_engine --sizes 10000 100000 --skip-rowwise-above 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from design_engine import calculate_scenario_logic
+
+
+# --- 1. REFERENCE: THE ORIGINAL ROW-WISE PATH ---
+
+def calculate_scenario_logic_rowwise(df, cart_value):
+    """The original apply()-based implementation, kept as the baseline."""
+    res = df.copy()
+
+    def get_offer(price, threshold, cart):
+        if cart >= threshold:
+            return 0, 0, "FREE"
+        else:
+            gap = threshold - cart
+            return price, gap, f"Pay {price} or Add {gap}"
+
+    res['Locker_Final_Cost'], res['Locker_TopUp_Gap'], res['Locker_Display'] = zip(*res.apply(
+        lambda x: get_offer(x['Locker_Price'], x['Locker_Threshold'], cart_value), axis=1
+    ))
+    res['Home_Final_Cost'], res['Home_TopUp_Gap'], res['Home_Display'] = zip(*res.apply(
+        lambda x: get_offer(x['Home_Price'], x['Home_Threshold'], cart_value), axis=1
+    ))
+    res['Shop_Final_Cost'], res['Shop_TopUp_Gap'], res['Shop_Display'] = zip(*res.apply(
+        lambda x: get_offer(x['Shop_Price'], x['Shop_Threshold'], cart_value), axis=1
+    ))
+
+    res['Locker_Exp_Display'] = res['Locker_Exp_Price'].apply(lambda x: f"Pay {x}")
+    res['Home_Exp_Display'] = res['Home_Exp_Price'].apply(lambda x: f"Pay {x}")
+
+    mask_double_free = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] == 0)
+    mask_illogical_shop = (res['Locker_TopUp_Gap'] == 0) & (res['Shop_TopUp_Gap'] > 0)
+    mask_illogical_locker = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] > 0)
+
+    mask_bad = mask_double_free | mask_illogical_shop | mask_illogical_locker
+    return res[~mask_bad].copy()
+
+
+# --- 2. SYNTHETIC DESIGN SPACES ---
+
+def make_combinations(n_rows, seed=0):
+    """Random combinations drawn from widened versions of the sidebar level lists."""
+    rng = np.random.default_rng(seed)
+    levels = {
+        "Locker_Price": [19, 29, 39, 49],
+        "Locker_Threshold": [149, 199, 249, 299, 349],
+        "Locker_Exp_Price": [49, 59, 69],
+        "Locker_Is_Green": [True, False],
+        "Locker_Distance": ["<1 km", "1-2 km", "2-3 km"],
+        "Home_Price": [59, 69, 79, 89],
+        "Home_Threshold": [499, 599, 699, 799, 899],
+        "Home_Exp_Price": [99, 129, 149],
+        "Home_Is_Green": [True, False],
+        "Shop_Price": [0, 19, 29],
+        "Shop_Threshold": [99, 149, 249],
+        "Shop_Is_Green": [True, False],
+        "Shop_Distance": ["2-4 km", "4-6 km", ">6 km"],
+    }
+    data = {col: np.asarray(vals)[rng.integers(0, len(vals), n_rows)] for col, vals in levels.items()}
+    return pd.DataFrame(data)
+
+
+def time_call(func, *args, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# --- 3. MAIN ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--carts", type=int, nargs="+", default=[240, 750])
+    parser.add_argument("--skip-rowwise-above", type=int, default=None,
+                        help="Skip the (slow) row-wise path for sizes above this number of rows.")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'cart':>6} {'row-wise (s)':>14} {'vectorized (s)':>16} {'speed-up':>10}  check")
+    for n_rows in args.sizes:
+        df = make_combinations(n_rows)
+        for cart in args.carts:
+            t_vec, res_vec = time_call(calculate_scenario_logic, df, cart, repeat=3)
+
+            if args.skip_rowwise_above is not None and n_rows > args.skip_rowwise_above:
+                print(f"{n_rows:>10} {cart:>6} {'skipped':>14} {t_vec:>16.4f} {'-':>10}  -")
+                continue
+
+            t_row, res_row = time_call(calculate_scenario_logic_rowwise, df, cart)
+            # Compare values only: pandas may infer a different string dtype for the display columns
+            same = res_row.astype(object).equals(res_vec.astype(object))
+            print(f"{n_rows:>10} {cart:>6} {t_row:>14.4f} {t_vec:>16.4f} {t_row / t_vec:>9.0f}x  {'OK' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark: the design generation pipeline, stage by stage, as the design
+space grows.
+
+    generate_full_factorial -> calculate_scenario_logic -> drop_duplicates -> sample
+
+plus the integer-keyed de-duplication and the coded (level code) pipeline
+that the apps use. Every stage is timed (best of --repeat) and then run
+once more under tracemalloc for its peak memory. The grid scales the number
+of attributes (8 = prices, thresholds and express prices only; 13 = with
+the green badges and distances) and the number of levels per attribute.
+
+Run from the repo root:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --attributes 8 13 --levels 2 3 --out bench.json
+    python -m benchmarks.bench_pipeline --compare before.json after.json
+
+Results go to a JSON file (default: bench_pipeline.json) with the commit
+and library versions, so runs of two commits can be compared with --compare.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from design_codes import unique_visuals_per_context
+from design_engine import calculate_scenario_logic, first_occurrence, generate_full_factorial, visual_keys
+from design_generator import DISPLAY_COLS
+from design_space import DesignSpace
+
+CONTEXT = {"val": 240, "label": "Small Basket (240kr)", "n": 8}
+SEED = 42
+
+
+# --- 1. SYNTHETIC DESIGN SPACES ---
+
+# Attributes every space has (the offer logic needs them), then the optional ones
+CORE_ATTRIBUTES = [
+    "Locker_Price", "Locker_Threshold", "Locker_Exp_Price",
+    "Home_Price", "Home_Threshold", "Home_Exp_Price",
+    "Shop_Price", "Shop_Threshold",
+]
+OPTIONAL_ATTRIBUTES = ["Locker_Is_Green", "Home_Is_Green", "Shop_Is_Green", "Locker_Distance", "Shop_Distance"]
+
+# Long level lists per attribute; a space with L levels uses the first L of each
+LEVEL_POOLS = {
+    "Locker_Price": [19, 29, 39, 49, 59, 69], "Locker_Threshold": [149, 199, 249, 299, 349, 399],
+    "Locker_Exp_Price": [49, 59, 69, 79, 89, 99],
+    "Home_Price": [59, 69, 79, 89, 99, 109], "Home_Threshold": [599, 699, 799, 899, 999, 1099],
+    "Home_Exp_Price": [99, 129, 149, 169, 189, 199],
+    "Shop_Price": [19, 29, 39, 49, 59, 69], "Shop_Threshold": [149, 199, 249, 299, 349, 399],
+    "Locker_Is_Green": [True, False], "Home_Is_Green": [True, False], "Shop_Is_Green": [True, False],
+    "Locker_Distance": ["<1 km", "1-2 km", "2-3 km", "3-4 km", "4-5 km", "5-6 km"],
+    "Shop_Distance": ["2-4 km", "4-6 km", ">6 km", "6-8 km", "8-10 km", "10-12 km"],
+}
+
+
+def make_levels(n_attributes, n_levels):
+    """Sidebar-like level lists: the core attributes plus the first optional ones."""
+    if not len(CORE_ATTRIBUTES) <= n_attributes <= len(CORE_ATTRIBUTES) + len(OPTIONAL_ATTRIBUTES):
+        raise ValueError(f"n_attributes must be between {len(CORE_ATTRIBUTES)} and "
+                         f"{len(CORE_ATTRIBUTES) + len(OPTIONAL_ATTRIBUTES)}")
+    columns = CORE_ATTRIBUTES + OPTIONAL_ATTRIBUTES[:n_attributes - len(CORE_ATTRIBUTES)]
+    return {col: LEVEL_POOLS[col][:n_levels] for col in columns}
+
+
+# --- 2. STAGES ---
+
+def run_stages(levels):
+    """
+    The pipeline as a list of (stage name, function of the previous results).
+    Each function gets the dict of results so far and returns its own result.
+    """
+    display_cols = [col for col in DISPLAY_COLS
+                    if col in levels or col.endswith("_Display")]
+
+    def unique_rows(results):
+        calculated = results["calculate_scenario_logic"]
+        return calculated[first_occurrence(visual_keys(calculated, display_cols, levels))]
+
+    def coded(results):
+        space = DesignSpace(levels)
+        unique = unique_visuals_per_context(space, [CONTEXT], display_cols)[0]
+        return unique.sample(n=min(CONTEXT["n"], len(unique)), random_state=SEED).to_frame()
+
+    return [
+        ("generate_full_factorial", lambda r: generate_full_factorial(levels)),
+        ("calculate_scenario_logic", lambda r: calculate_scenario_logic(r["generate_full_factorial"], CONTEXT["val"])),
+        ("drop_duplicates", lambda r: r["calculate_scenario_logic"].drop_duplicates(subset=display_cols)),
+        ("visual_keys", unique_rows),
+        ("sample", lambda r: r["drop_duplicates"].sample(n=min(CONTEXT["n"], len(r["drop_duplicates"])),
+                                                         random_state=SEED)),
+        ("coded_pipeline", coded),
+    ]
+
+
+def _best_time(func, results, repeat):
+    best, output = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func(results)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def _peak_memory(func, results):
+    """Peak memory (bytes) allocated while the stage runs, inputs excluded."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func(results)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - baseline
+
+
+def benchmark_space(n_attributes, n_levels, repeat=3):
+    """One result record per stage for the space with these dimensions."""
+    levels = make_levels(n_attributes, n_levels)
+    size = DesignSpace(levels).size
+    results, records = {}, []
+    for stage, func in run_stages(levels):
+        seconds, output = _best_time(func, results, repeat)
+        peak = _peak_memory(func, results)
+        results[stage] = output
+        records.append({
+            "attributes": n_attributes, "levels_per_attribute": n_levels, "space_rows": size,
+            "stage": stage, "seconds": round(seconds, 6), "peak_mb": round(peak / 1024 ** 2, 3),
+            "output_rows": len(output),
+        })
+    return records
+
+
+# --- 3. RESULT FILES ---
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+        "platform": platform.platform(), "processor": platform.processor(),
+    }
+
+
+def compare(before_path, after_path, threshold=1.2):
+    """
+    Prints the time and memory ratio after / before of every (space, stage)
+    in both files. Returns the number of regressions (ratio above `threshold`).
+    """
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+
+    def keyed(run):
+        return {(r["attributes"], r["levels_per_attribute"], r["stage"]): r for r in run["results"]}
+
+    old, new = keyed(before), keyed(after)
+    print(f"{before['environment']['commit']} -> {after['environment']['commit']}")
+    print(f"{'attrs':>5} {'levels':>6} {'stage':<26} {'time':>8} {'memory':>8}")
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        time_ratio = new[key]["seconds"] / max(old[key]["seconds"], 1e-9)
+        memory_ratio = new[key]["peak_mb"] / max(old[key]["peak_mb"], 1e-9)
+        # Tiny stages are noisy: a regression must also cost 5 ms or 1 MB more
+        slower = time_ratio > threshold and new[key]["seconds"] - old[key]["seconds"] > 0.005
+        bigger = memory_ratio > threshold and new[key]["peak_mb"] - old[key]["peak_mb"] > 1
+        flag = "  <-- slower" if slower else "  <-- more memory" if bigger else ""
+        regressions += bool(flag)
+        print(f"{key[0]:>5} {key[1]:>6} {key[2]:<26} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+    return regressions
+
+
+# --- 4. MAIN ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attributes", type=int, nargs="+", default=[8, 10, 13])
+    parser.add_argument("--levels", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--max-rows", type=int, default=2_000_000,
+                        help="Skip spaces with more combinations than this.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per stage (the best one counts).")
+    parser.add_argument("--out", default="bench_pipeline.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two result files instead of running the benchmark.")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    records = []
+    print(f"{'attrs':>5} {'levels':>6} {'rows':>10} {'stage':<26} {'time (s)':>10} {'peak (MB)':>10} {'out rows':>10}")
+    for n_attributes in args.attributes:
+        for n_levels in args.levels:
+            size = DesignSpace(make_levels(n_attributes, n_levels)).size
+            if size > args.max_rows:
+                print(f"{n_attributes:>5} {n_levels:>6} {size:>10} skipped (--max-rows {args.max_rows})")
+                continue
+            for r in benchmark_space(n_attributes, n_levels, args.repeat):
+                records.append(r)
+                print(f"{n_attributes:>5} {n_levels:>6} {size:>10} {r['stage']:<26} "
+                      f"{r['seconds']:>10.4f} {r['peak_mb']:>10.1f} {r['output_rows']:>10}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "context": CONTEXT, "results": records}, f, indent=1)
+    print(f"{len(records)} results -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
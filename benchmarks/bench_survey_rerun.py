@@ -0,0 +1,228 @@
+"""
+Benchmark: what one click costs in a survey app, measured on a real
+Streamlit server over its websocket, as a browser would see it.
+
+For each app the script starts `streamlit run` (headless), opens a session,
+picks the demo design, starts the survey and then clicks alternately an
+option of the first scenario and "Back". Per click it reports
+
+    latency     BackMsg sent -> script_finished received
+    payload     bytes of all ForwardMsgs of that rerun
+    deltas      elements / blocks sent in that rerun
+
+Widget ids are read from the deltas, the click is sent like the frontend
+does (trigger value, and the fragment id of the widget for fragment reruns).
+Needs the `websockets` package (installed with Streamlit's server).
+
+Run from the repo root:
+    python -m benchmarks.bench_survey_rerun
+    git show HEAD~1:shipping_topup_app_sus_v3.py > old_v3.py
+    python -m benchmarks.bench_survey_rerun --apps old_v3.py shipping_topup_app_sus_v3.py --clicks 60
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+DEMO_CHECKBOX = "Or use Demo Data"
+START_BUTTON = "Start Checkout Experiment"
+BACK_BUTTON = "⬅️ Back"
+
+
+# --- 1. SESSION ---
+
+class SurveySession:
+    """
+    One websocket session: sends reruns like the frontend (every widget value
+    so far, plus the clicked trigger) and collects the ForwardMsgs until the
+    script finishes.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.session_id = None
+        self.widgets = {}  # label (component name for components) -> (widget kind, id, fragment id)
+        self.components = {}  # component name -> its JSON arguments
+        self.options = {}  # radio label -> its option labels
+        self._values = {}  # widget id -> WidgetState of the widgets that keep a value
+
+    async def rerun(self, widget=None, value=True):
+        """Reruns the script (setting or clicking `widget` if given); returns (seconds, bytes, deltas)."""
+        msg = BackMsg()
+        fragment_id = ""
+        trigger = None
+        if widget is not None:
+            kind, widget_id, fragment_id = self.widgets[widget]
+            state = WidgetState(id=widget_id)
+            if kind == "button":
+                state.trigger_value = value
+                trigger = state
+            elif kind == "checkbox":
+                state.bool_value = value
+            elif kind == "radio":
+                state.string_value = value
+            elif kind == "component_instance":
+                state.json_value = json.dumps(value)
+            else:
+                state.file_uploader_state_value.CopyFrom(value)
+            if trigger is None:
+                self._values[widget_id] = state
+        states = list(self._values.values()) + ([trigger] if trigger is not None else [])
+        msg.rerun_script.widget_states.widgets.extend(states)
+        msg.rerun_script.fragment_id = fragment_id
+
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        n_bytes = n_deltas = 0
+        # The rerun redraws the whole page or only the fragment: forget the widgets it replaces
+        self.widgets = {label: info for label, info in self.widgets.items()
+                        if fragment_id and info[2] != fragment_id}
+        while True:
+            data = await self.ws.recv()
+            n_bytes += len(data)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(data)
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = fwd.new_session.initialize.session_id
+            elif kind == "delta":
+                n_deltas += 1
+                self._record_widget(fwd.delta)
+            # st.rerun() in the script ends the run early and starts the next one: wait for that
+            elif kind == "script_finished" and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                # Like the frontend, drop the values of widgets that are no longer on the page
+                on_page = {widget_id for _, widget_id, _ in self.widgets.values()}
+                self._values = {widget_id: state for widget_id, state in self._values.items() if widget_id in on_page}
+                return time.perf_counter() - start, n_bytes, n_deltas
+
+    def _record_widget(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind in ("button", "checkbox", "radio", "file_uploader"):
+            widget = getattr(element, kind)
+            self.widgets[widget.label] = (kind, widget.id, delta.fragment_id)
+            if kind == "radio":
+                self.options[widget.label] = list(widget.options)
+        elif kind == "component_instance":
+            component = element.component_instance
+            self.widgets[component.component_name] = (kind, component.id, delta.fragment_id)
+            self.components[component.component_name] = json.loads(component.json_args)
+
+    async def upload(self, label, name, data, http_url):
+        """Uploads `data` as file `name` into the file uploader `label` (and reruns, as the browser does)."""
+        msg = BackMsg()
+        msg.file_urls_request.request_id = "upload"
+        msg.file_urls_request.file_names.append(name)
+        msg.file_urls_request.session_id = self.session_id
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            if fwd.WhichOneof("type") == "file_urls_response":
+                urls = fwd.file_urls_response.file_urls[0]
+                break
+
+        boundary = "benchmark-boundary"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                f"Content-Type: text/csv\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        request = urllib.request.Request(http_url + urls.upload_url, data=body, method="PUT",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        urllib.request.urlopen(request).close()
+
+        state = FileUploaderState()
+        state.uploaded_file_info.add(name=name, size=len(data), file_id=urls.file_id, file_urls=urls)
+        return await self.rerun(label, state)
+
+    def option_label(self):
+        """Label of the last choice button on screen (an answer of the current scenario)."""
+        return [label for label, (kind, _, _) in self.widgets.items()
+                if kind == "button" and label != BACK_BUTTON][-1]
+
+
+async def run_clicks(url, n_clicks):
+    """Per click (seconds, bytes, deltas), alternating an answer and Back."""
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        session = SurveySession(ws)
+        await session.rerun()
+        await session.rerun(DEMO_CHECKBOX)
+        await session.rerun(START_BUTTON)
+        results = []
+        for i in range(n_clicks):
+            label = session.option_label() if i % 2 == 0 else BACK_BUTTON
+            results.append(await session.rerun(label))
+        return results
+
+
+# --- 2. SERVER ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false",
+         # Uploads come from this script, not from a page with the XSRF cookie
+         "--server.enableXsrfProtection", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"streamlit did not start for {app}")
+
+
+def benchmark_app(app, n_clicks):
+    port = free_port()
+    server = start_server(app, port)
+    try:
+        return asyncio.run(run_clicks(f"ws://127.0.0.1:{port}/_stcore/stream", n_clicks))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# --- 3. MAIN ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=["shipping_topup_app_sus_v3.py"])
+    parser.add_argument("--clicks", type=int, default=40, help="Clicks per app (answer, Back, answer, ...).")
+    args = parser.parse_args()
+    if websockets is None:
+        sys.exit("The websockets package is needed for this benchmark.")
+
+    print(f"{'app':<34} {'click':<7} {'mean (ms)':>10} {'p95 (ms)':>9} {'KB / click':>11} {'deltas':>7}")
+    for app in args.apps:
+        results = np.array(benchmark_app(app, args.clicks))
+        for name, rows in [("answer", results[0::2]), ("back", results[1::2])]:
+            print(f"{app:<34} {name:<7} {rows[:, 0].mean() * 1e3:>10.2f} {np.percentile(rows[:, 0], 95) * 1e3:>9.2f} "
+                  f"{rows[:, 1].mean() / 1024:>11.2f} {rows[:, 2].mean():>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: server work per respondent of the v3 survey in each of its
+scenario screen modes.
+
+A headless server gets the design CSV uploaded like a browser would, then
+each simulated respondent answers every scenario (the first option of each):
+
+    buttons     one click -> one script run per scenario
+    compact     one radio choice -> one script run per scenario, few elements
+    block       the component sends the answers per basket
+    all         the component sends all answers at the end
+
+For the component modes the browser's part (drawing, clicks, Back) costs
+the server nothing, so only the batches are sent. Reported per respondent,
+from the Start click to the completion page: script runs, summed server
+latency, and bytes / deltas sent to the browser.
+
+Run from the repo root:
+    python -m benchmarks.bench_survey_respondent
+    python -m benchmarks.bench_survey_respondent --csv shipping_topup_design_2.csv --respondents 10
+"""
+import argparse
+import asyncio
+import sys
+
+import numpy as np
+
+from benchmarks.bench_survey_rerun import START_BUTTON, SurveySession, free_port, start_server, websockets
+
+APP = "shipping_topup_app_sus_v3.py"
+MODE_LABELS = {
+    "buttons": "Buttons (one server round-trip per click)",
+    "compact": "Compact (one HTML block and one choice list)",
+    "block": "Checkout component, answers sent per basket",
+    "all": "Checkout component, answers sent at the end",
+}
+COMPLETION_BUTTON = "Restart"
+CHOICE_RADIO = "Your choice"
+
+
+async def respondent(port, mode, data):
+    """(seconds, bytes, deltas) of every script run of one respondent, Start click included."""
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as ws:
+        session = SurveySession(ws)
+        await session.rerun()
+        await session.rerun("Scenario screen", MODE_LABELS[mode])
+        await session.upload("Upload Design CSV", "design.csv", data, f"http://127.0.0.1:{port}")
+
+        runs = [await session.rerun(START_BUTTON)]
+        if mode == "buttons":
+            while COMPLETION_BUTTON not in session.widgets:
+                runs.append(await session.rerun(session.option_label()))
+        elif mode == "compact":
+            while COMPLETION_BUTTON not in session.widgets:
+                runs.append(await session.rerun(CHOICE_RADIO, session.options[CHOICE_RADIO][0]))
+        else:
+            name = next(name for name in session.components if name.endswith("checkout_scenarios"))
+            scenarios = session.components[name]["scenarios"]
+            answers = []
+            for q, scenario in enumerate(scenarios):
+                answers.append({
+                    "Scenario_ID": scenario["scenario_id"], "Context": scenario["context_label"],
+                    "Cart_Value": scenario["cart_value"], "Choice": scenario["options"][0]["buttons"][0]["answer"],
+                    "Answered_At": "", "Response_Ms": 0,
+                })
+                done = q == len(scenarios) - 1
+                if done or (mode == "block" and scenarios[q + 1]["context_label"] != scenario["context_label"]):
+                    batch = {"batch": len(runs), "done": done, "answers": list(answers)}
+                    runs.append(await session.rerun(name, batch))
+        if COMPLETION_BUTTON not in session.widgets:
+            raise RuntimeError(f"{mode}: the survey did not reach the completion page")
+        return runs
+
+
+async def run_all(port, modes, data, n_respondents):
+    return {mode: [await respondent(port, mode, data) for _ in range(n_respondents)] for mode in modes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="shipping_topup_design_2.csv")
+    parser.add_argument("--modes", nargs="+", default=list(MODE_LABELS), choices=list(MODE_LABELS))
+    parser.add_argument("--respondents", type=int, default=5)
+    args = parser.parse_args()
+    if websockets is None:
+        sys.exit("The websockets package is needed for this benchmark.")
+    with open(args.csv, "rb") as f:
+        data = f.read()
+
+    port = free_port()
+    server = start_server(APP, port)
+    try:
+        results = asyncio.run(run_all(port, args.modes, data, args.respondents))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'mode':<8} {'runs':>5} {'server (ms)':>12} {'KB sent':>8} {'deltas':>7}   (per respondent)")
+    for mode, respondents in results.items():
+        totals = np.array([np.array(runs).sum(axis=0) for runs in respondents])
+        n_runs = np.mean([len(runs) for runs in respondents])
+        print(f"{mode:<8} {n_runs:>5.0f} {totals[:, 0].mean() * 1e3:>12.1f} {totals[:, 1].mean() / 1024:>8.1f} "
+              f"{totals[:, 2].mean():>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Checkout screen as one Streamlit component (index.html, no build step).
+
+The respondent's whole scenario sequence (survey_runtime.scenario_sequence)
+goes to the browser once; the five options, the choices and Back are
+handled there without a server round-trip. The answers come back in
+batches, each a full list of the answers so far with their click times:
+
+    send="block"   after the last scenario of each basket
+    send="all"     once, after the last scenario
+
+So a respondent costs one script run per basket (or one in total) instead
+of one per click.
+"""
+import os
+
+import streamlit.components.v1 as components
+
+SEND_MODES = ("block", "all")
+
+_checkout = components.declare_component("checkout_scenarios", path=os.path.dirname(os.path.abspath(__file__)))
+
+
+def checkout_scenarios(scenarios, send="block", answers=None, key=None):
+    """
+    Draws the scenarios and returns the last batch the browser sent:
+    None before the first one, then {"batch": n, "done": bool, "answers": [...]}
+    with answers as dicts of Scenario_ID, Context, Cart_Value, Choice,
+    Answered_At (ISO time) and Response_Ms. `answers` already stored on the
+    server let a reloaded page continue where the respondent was.
+    """
+    if send not in SEND_MODES:
+        raise ValueError(f"send must be one of {SEND_MODES}")
+    return _checkout(scenarios=scenarios, send=send, answers=answers or [], key=key, default=None)
@@ -3,6 +3,9 @@ import pandas as pd
 import itertools
 import numpy as np
 
+from design_diagnostics import design_diagnostics
+from design_engine import calculate_scenario_logic, first_occurrence, visual_keys
+
 # --- 1. CONFIGURATION & SIDEBAR ---
 st.set_page_config(layout="wide", page_title="Shipping Choice Experiment Designer")
 
@@ -58,57 +61,6 @@ def generate_full_factorial():
     
     return pd.DataFrame(combinations, columns=cols)
 
-def calculate_scenario_logic(df, cart_value):
-    """
-    Applies Top-Up Logic AND Filtering.
-    """
-    res = df.copy()
-    
-    # Logic Helper
-    def get_offer(price, threshold, cart):
-        if cart >= threshold:
-            return 0, 0, "FREE"
-        else:
-            gap = threshold - cart
-            return price, gap, f"Pay {price} or Add {gap}"
-
-    # 1. Calculate Costs & Gaps
-    res['Locker_Final_Cost'], res['Locker_TopUp_Gap'], res['Locker_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Locker_Price'], x['Locker_Threshold'], cart_value), axis=1
-    ))
-    res['Home_Final_Cost'], res['Home_TopUp_Gap'], res['Home_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Home_Price'], x['Home_Threshold'], cart_value), axis=1
-    ))
-    res['Shop_Final_Cost'], res['Shop_TopUp_Gap'], res['Shop_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Shop_Price'], x['Shop_Threshold'], cart_value), axis=1
-    ))
-    
-    # Express Displays
-    res['Locker_Exp_Display'] = res['Locker_Exp_Price'].apply(lambda x: f"Pay {x}")
-    res['Home_Exp_Display'] = res['Home_Exp_Price'].apply(lambda x: f"Pay {x}")
-
-    # ==========================================
-    # LOGIC FILTERS
-    # ==========================================
-    
-    # Filter 1: Eliminate Double Free (Home vs Locker)
-    mask_double_free = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] == 0)
-    
-    # Filter 2: Enforce Hierarchy (Locker vs Shop)
-    # If Locker is Free, Shop MUST be Free.
-    # (Catches your Scenario 2: Locker Free but Shop Paid)
-    mask_illogical_shop = (res['Locker_TopUp_Gap'] == 0) & (res['Shop_TopUp_Gap'] > 0)
-
-    # Filter 3: Enforce Hierarchy (Home vs Locker)
-    # If Home is Free, Locker MUST be Free.
-    mask_illogical_locker = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] > 0)
-
-    # Apply Filters
-    mask_bad = mask_double_free | mask_illogical_shop | mask_illogical_locker
-    res_filtered = res[~mask_bad].copy()
-
-    return res_filtered
-
 # --- 3. EXECUTION ---
 
 # --- 3. EXECUTION (UPDATED WITH DEDUPLICATION) ---
@@ -150,8 +102,17 @@ else:
         ]
         
         # C. Remove "Visual Duplicates"
-        # This keeps the first occurrence of a visual scenario and drops the rest
-        unique_visuals = calculated_df.drop_duplicates(subset=display_cols)
+        # This keeps the first occurrence of a visual scenario and drops the rest.
+        # The display columns are compared as one integer key built from the levels.
+        levels = {
+            "Locker_Price": locker_prices, "Locker_Threshold": locker_thresh,
+            "Locker_Exp_Price": locker_exp_prices,
+            "Home_Price": home_prices, "Home_Threshold": home_thresh,
+            "Home_Exp_Price": home_exp_prices,
+            "Shop_Price": shop_prices, "Shop_Threshold": shop_thresh,
+        }
+        keys = visual_keys(calculated_df, display_cols, levels)
+        unique_visuals = calculated_df[first_occurrence(keys)]
         
         # D. Sample from the UNIQUE list
         # If we have enough unique rows, sample n. If not, take all of them.
@@ -187,6 +148,18 @@ else:
 
     # --- 5. DETAILED DATA & EXPORT ---
     
+    with st.expander("Design diagnostics"):
+        diagnostics = design_diagnostics(final_design)
+        st.write("**Level frequencies** (share among the scenarios that show the attribute; "
+                 "a FREE offer hides its price and threshold)")
+        st.dataframe(diagnostics.level_frequencies(), hide_index=True)
+        st.write("**Association between attributes** (Cramér's V: 0 = independent, 1 = confounded)")
+        st.dataframe(diagnostics.correlations().round(2))
+        st.write("**Attribute overlap** (share of alternative pairs with the same value)")
+        st.dataframe(pd.Series(diagnostics.overlap_summary(), name="Value"))
+        st.write("**Top-up gaps per basket** (0 = FREE)")
+        st.dataframe(diagnostics.gap_distribution(), hide_index=True)
+
     with st.expander("View Underlying Data (Prices & Gaps)"):
         st.write("This data contains the raw numbers for your analysis.")
         st.dataframe(final_design)
@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
-import itertools
 import numpy as np
 
+from design_codes import factorial_dominance_report
+from design_constraints import DEFAULT_CONSTRAINTS, ConstraintError, ConstraintSet
+from design_delta import IncrementalCandidates
+from design_diagnostics import design_diagnostics
+from design_blocks import block_correlations
+from design_cache import DesignCache, design_cache_key
+from design_generator import DISPLAY_COLS, build_final_design
+from design_space import PERMUTATION_LIMIT, DesignSpace
+from design_search import DEFAULT_PRIORS, BayesianDError, d_error, information_factors, mnl_design_matrix
+
 # --- 1. CONFIGURATION & SIDEBAR ---
 st.set_page_config(layout="wide", page_title="Shipping Choice Experiment Designer")
 
@@ -40,7 +49,37 @@ with st.sidebar:
     st.header("2. Experiment Settings")
     n_small = st.number_input("Scenarios for Small Basket", value=8, min_value=1)
     n_big = st.number_input("Scenarios for Big Basket", value=8, min_value=1)
+    extra_carts_text = st.text_input("Additional Basket Values (SEK, comma-separated)", value="",
+                                     help="e.g. 150, 300, 450. Each value becomes one more basket context.")
+    n_extra = st.number_input("Scenarios per Additional Basket", value=4, min_value=1)
     seed = st.number_input("Random Seed (for reproducibility)", value=42)
+    scenarios_per_block = st.number_input("Scenarios per Respondent (block size)", value=16, min_value=1,
+                                          help="Larger designs are split into blocks of this size that show "
+                                               "every attribute level in the same proportions (Block column).")
+    generation_mode = st.radio(
+        "Generation Mode",
+        ["Full factorial (in memory)", "Streaming (low memory)", "Implicit sampling (huge spaces)"],
+        help="Streaming enumerates the combinations in chunks and filters/de-duplicates each chunk. "
+             "Implicit sampling never enumerates: it draws random combinations by index until enough "
+             "unique scenarios pass the filters (or enumerates the filtered space when almost every "
+             "draw is rejected)."
+    )
+    streaming_mode = generation_mode.startswith("Streaming")
+    implicit_mode = generation_mode.startswith("Implicit")
+    chunk_size = st.number_input("Chunk size (rows)", value=100_000, min_value=1_000, step=10_000,
+                                 disabled=not streaming_mode)
+    design_search = st.checkbox("D-optimal design search (Fedorov exchange)", value=False,
+                                help="Instead of a random sample, pick the scenarios that minimize the D-error "
+                                     "of an MNL over the five delivery alternatives.")
+    candidate_pool = st.number_input("Candidate pool for implicit sampling", value=5_000, min_value=100, step=1_000,
+                                     disabled=not (design_search and implicit_mode))
+    search_starts = st.number_input("Random starts (parallel)", value=1, min_value=1, max_value=256,
+                                    disabled=not design_search,
+                                    help="1 = a single Fedorov exchange on the D-error. More starts run on all "
+                                         "cores and the best design on D-error, level balance and overlap wins.")
+    search_method = st.radio("Search per start", ["exchange", "annealing"], horizontal=True,
+                             disabled=not (design_search and search_starts > 1),
+                             format_func={"exchange": "Coordinate exchange", "annealing": "Simulated annealing"}.get)
 
     # --- NEW SECTION ON DISTANCE TRADE-OFF ---   
     st.subheader("📍 Distance Attributes")
@@ -49,83 +88,58 @@ with st.sidebar:
     locker_dist_opts = st.multiselect("Locker Distances", ["<1 km", "1-2 km", "2-3 km"], default=["<1 km", "1-2 km"])
     shop_dist_opts = st.multiselect("Shop Distances", ["2-4 km", "4-6 km", ">6 km"], default=["2-4 km", "4-6 km"])
 
-# --- 2. GENERATION LOGIC ---
+    st.header("3. Logic Filters")
+    st.caption("One rule per line; every scenario must satisfy all of them. "
+               "'A -> B' means 'if A then B'. Names: attribute columns, Cart, and "
+               "<Nest>_Final_Cost / <Nest>_TopUp_Gap / <Nest>_Is_Free for Locker, Home and Shop.")
+    constraints_file = st.file_uploader("Load rules from a file", type=["txt"])
+    if constraints_file is not None:
+        constraints_text = constraints_file.getvalue().decode("utf-8")
+        st.code(constraints_text, language=None)
+    else:
+        constraints_text = st.text_area("Constraint rules", value=DEFAULT_CONSTRAINTS, height=200)
+    # Dominated = another alternative is at least as cheap, fast, green and close, and better on one
+    dominance_filter = st.radio("Dominated scenarios", ["Keep", "Remove dominated", "Remove near-dominated"],
+                                help="Near-dominated: at least as good within 10 SEK and 0.5 km.")
+    if dominance_filter == "Remove dominated":
+        constraints_text += "\nnot Is_Dominated"
+    elif dominance_filter == "Remove near-dominated":
+        constraints_text += "\nnot Is_Near_Dominated"
+    show_dominance_report = st.checkbox("Report dominated candidates per rule", value=False)
 
-def generate_full_factorial():
-    """Generates all possible combinations of attributes."""
-    # Create the Cartesian product of all selected levels
-    combinations = list(itertools.product(
-        locker_prices, locker_thresh,
-        locker_exp_prices, locker_green_opts, locker_dist_opts, # Added Green and distance
-        home_prices, home_thresh,
-        home_exp_prices, home_green_opts,     # Added Green
-        shop_prices, shop_thresh, shop_green_opts, shop_dist_opts # Added Distance
-    ))
-    
-    cols = [
-        "Locker_Price", "Locker_Threshold",
-        "Locker_Exp_Price", "Locker_Is_Green", "Locker_Distance", # Column Name
-        "Home_Price", "Home_Threshold",
-        "Home_Exp_Price", "Home_Is_Green",     # Column Name
-        "Shop_Price", "Shop_Threshold", "Shop_Is_Green","Shop_Distance"
-    ]
-    
-    return pd.DataFrame(combinations, columns=cols)
+# --- 2. GENERATION LOGIC ---
 
-def calculate_scenario_logic(df, cart_value):
-    """
-    Applies Top-Up Logic AND Filtering.
-    """
-    res = df.copy()
-    
-    # Logic Helper
-    def get_offer(price, threshold, cart):
-        if cart >= threshold:
-            return 0, 0, "FREE"
-        else:
-            gap = threshold - cart
-            return price, gap, f"Pay {price} or Add {gap}"
-
-    # 1. Calculate Costs & Gaps
-    res['Locker_Final_Cost'], res['Locker_TopUp_Gap'], res['Locker_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Locker_Price'], x['Locker_Threshold'], cart_value), axis=1
-    ))
-    res['Home_Final_Cost'], res['Home_TopUp_Gap'], res['Home_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Home_Price'], x['Home_Threshold'], cart_value), axis=1
-    ))
-    res['Shop_Final_Cost'], res['Shop_TopUp_Gap'], res['Shop_Display'] = zip(*res.apply(
-        lambda x: get_offer(x['Shop_Price'], x['Shop_Threshold'], cart_value), axis=1
-    ))
-    
-    # Express Displays
-    res['Locker_Exp_Display'] = res['Locker_Exp_Price'].apply(lambda x: f"Pay {x}")
-    res['Home_Exp_Display'] = res['Home_Exp_Price'].apply(lambda x: f"Pay {x}")
+# Attribute levels, in the order of the Cartesian product
+levels = {
+    "Locker_Price": locker_prices, "Locker_Threshold": locker_thresh,
+    "Locker_Exp_Price": locker_exp_prices, "Locker_Is_Green": locker_green_opts, "Locker_Distance": locker_dist_opts, # Added Green and distance
+    "Home_Price": home_prices, "Home_Threshold": home_thresh,
+    "Home_Exp_Price": home_exp_prices, "Home_Is_Green": home_green_opts,     # Added Green
+    "Shop_Price": shop_prices, "Shop_Threshold": shop_thresh, "Shop_Is_Green": shop_green_opts, "Shop_Distance": shop_dist_opts # Added Distance
+}
 
-    # ==========================================
-    # LOGIC FILTERS
-    # ==========================================
-    
-    # Filter 1: Eliminate Double Free (Home vs Locker)
-    mask_double_free = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] == 0)
-    
-    # Filter 2: Enforce Hierarchy (Locker vs Shop)
-    mask_illogical_shop = (res['Locker_TopUp_Gap'] == 0) & (res['Shop_TopUp_Gap'] > 0)
 
-    # Filter 3: Enforce Hierarchy (Home vs Locker)
-    mask_illogical_locker = (res['Home_TopUp_Gap'] == 0) & (res['Locker_TopUp_Gap'] > 0)
+@st.cache_resource
+def get_design_cache():
+    """One cache per server process, shared by all sessions."""
+    return DesignCache()
 
-    # Apply Filters
-    mask_bad = mask_double_free | mask_illogical_shop | mask_illogical_locker
-    res_filtered = res[~mask_bad].copy()
+try:
+    extra_carts = [int(v) for v in extra_carts_text.replace(";", ",").split(",") if v.strip()]
+except ValueError:
+    st.error("Additional basket values must be whole numbers, separated by commas.")
+    st.stop()
 
-    return res_filtered
+try:
+    # Rule names are checked against the attribute columns here, before any build
+    constraints = ConstraintSet(constraints_text, levels)
+except ConstraintError as e:
+    st.error(f"Constraint error: {e}")
+    st.stop()
 
 # --- 3. EXECUTION ---
 
-# 1. Generate Full Matrix
-full_design = generate_full_factorial()
-
-if full_design.empty:
+if any(len(opts) == 0 for opts in levels.values()):
     st.error("Please select at least one level for every attribute in the sidebar.")
 else:
     # 2. Define Contexts (The Baskets)
@@ -133,50 +147,107 @@ else:
     contexts = [
         {"val": 240, "label": "Small Basket (240kr)", "n": n_small},
         {"val": 750, "label": "Big Basket (750kr)",   "n": n_big}
+    ] + [
+        {"val": val, "label": f"Basket ({val}kr)", "n": n_extra} for val in extra_carts
     ]
 
-    final_dfs = []
-    
-    # We loop through both contexts (Small & Big) to apply the same cleaning logic
-    for ctx in contexts:
-        # A. Apply Logic to the WHOLE universe of combinations first
-        temp_df = full_design.copy()
-        temp_df['Context_Cart_Value'] = ctx['val']
-        temp_df['Context_Label'] = ctx['label']
-        
-        # Calculate the display strings for all 512+ combinations
-        calculated_df = calculate_scenario_logic(temp_df, ctx['val'])
-        
-        # B. Define what columns constitute a "Unique Visual Scenario"
-        # UPDATED: We added 'Locker_Is_Green' and 'Home_Is_Green'.
-        # This ensures that "Home 79 (Green)" and "Home 79 (Not Green)" 
-        # are seen as DIFFERENT scenarios and not duplicates.
-        display_cols = [
-            'Shop_Display','Shop_Is_Green', 'Shop_Distance',
-            'Locker_Display', 'Locker_Exp_Display', 'Locker_Is_Green','Locker_Distance',
-            'Home_Display', 'Home_Exp_Display', 'Home_Is_Green'
-        ]
-        
-        # C. Remove "Visual Duplicates"
-        unique_visuals = calculated_df.drop_duplicates(subset=display_cols)
-        
-        # D. Sample from the UNIQUE list
-        if len(unique_visuals) >= ctx['n']:
-            sampled_df = unique_visuals.sample(n=ctx['n'], random_state=seed)
-        else:
-            st.warning(f"Note: Only {len(unique_visuals)} unique scenarios exist for {ctx['label']}. Returning all of them.")
-            sampled_df = unique_visuals
-            
-        final_dfs.append(sampled_df)
-
-    # Combine both baskets into one final design
-    final_design = pd.concat(final_dfs).reset_index(drop=True)
-    final_design.index.name = "Scenario_ID"
-    final_design.index += 1 # Start ID at 1 for readability
+    # B. Define what columns constitute a "Unique Visual Scenario"
+    # UPDATED: We added 'Locker_Is_Green' and 'Home_Is_Green'.
+    # This ensures that "Home 79 (Green)" and "Home 79 (Not Green)" 
+    # are seen as DIFFERENT scenarios and not duplicates.
+    display_cols = DISPLAY_COLS
+
+    if implicit_mode:
+        st.caption(f"Design space: {DesignSpace(levels).size:,} combinations (not materialized)")
+
+    # Filtered candidates of this session's last levels: a level change only filters the rows it adds
+    if "candidates" not in st.session_state:
+        st.session_state.candidates = IncrementalCandidates()
+
+    # Unchanged inputs -> same design, so serve it from the cache (memory, then disk).
+    # Streaming and in-memory enumeration give identical designs and share entries.
+    cache_key = design_cache_key(
+        levels=levels, contexts=contexts, display_cols=display_cols, seed=seed,
+        constraints=constraints_text,
+        sampling="implicit" if implicit_mode else "enumerated",
+        design_search=design_search,
+        candidate_pool=candidate_pool if (design_search and implicit_mode) else None,
+        search=(search_starts, search_method) if (design_search and search_starts > 1) else None,
+        scenarios_per_block=scenarios_per_block,
+    )
+    try:
+        (final_design, notes, traces), cache_source = get_design_cache().get_or_build(
+            cache_key, lambda: build_final_design(
+                levels, contexts, display_cols, seed, constraints,
+                mode="implicit" if implicit_mode else "streaming" if streaming_mode else "full",
+                chunk_size=chunk_size, design_search=design_search, candidate_pool=candidate_pool,
+                search_starts=search_starts, search_method=search_method, scenarios_per_block=scenarios_per_block,
+                candidates=st.session_state.candidates,
+            )
+        )
+    except ConstraintError as e:
+        st.error(f"Constraint error: {e}")
+        st.stop()
+    level_delta = st.session_state.candidates.last_update
+    if cache_source == "built" and level_delta and not level_delta["rebuilt"]:
+        st.caption(f"Level change: {level_delta['kept']:,} filtered rows carried over, "
+                   f"{level_delta['added']:,} added, {level_delta['removed']:,} removed.")
+    for note in notes:
+        st.warning(note)
     
     # --- 4. DISPLAY ---
 
     st.subheader(f"Generated Design ({len(final_design)} Scenarios)")
+    if cache_source != "built":
+        st.caption(f"Served from the design cache ({cache_source}).")
+    design_X, design_params = mnl_design_matrix(final_design)
+    st.caption(f"D-error (MNL, utility-neutral prior): {d_error(information_factors(design_X)):.4f} — lower is better.")
+
+    if "Block" in final_design.columns:
+        block_corr = block_correlations(final_design, final_design["Block"])
+        st.caption(f"Split into {final_design['Block'].nunique()} respondent blocks; largest |correlation| "
+                   f"between a block and an attribute level: {block_corr.max():.3f} ({block_corr.idxmax()}).")
+
+    if show_dominance_report:
+        with st.expander("Dominated candidates per rule (full factorial, before the filters)", expanded=True):
+            space = DesignSpace(levels)
+            if space.size > PERMUTATION_LIMIT:
+                # Even streamed, every combination would be decoded twice per basket
+                st.info(f"The full factorial has {space.size:,} combinations; the report is only computed "
+                        f"up to {PERMUTATION_LIMIT:,}.")
+                contexts_to_report = []
+            else:
+                contexts_to_report = contexts
+            # The report depends on the levels and baskets only: cache it next to the designs
+            report_key = design_cache_key(report="dominance", levels=levels,
+                                          contexts=[(ctx['val'], ctx['label']) for ctx in contexts_to_report])
+            reports, _ = get_design_cache().get_or_build(report_key, lambda: [
+                (factorial_dominance_report(space, ctx), factorial_dominance_report(space, ctx, near=True))
+                for ctx in contexts_to_report])
+            for ctx, (strict_report, near_report) in zip(contexts_to_report, reports):
+                st.write(f"**{ctx['label']}** — {space.size:,} candidates")
+                report_cols = st.columns(2)
+                report_cols[0].dataframe(strict_report, hide_index=True)
+                report_cols[1].dataframe(near_report, hide_index=True)
+
+    if traces:
+        with st.expander("Multi-start search: convergence of the best start"):
+            st.caption("Score = D-error x (1 + 0.5 x level imbalance + 0.5 x attribute overlap), per pass / step.")
+            st.line_chart(pd.DataFrame({label: pd.Series(trace) for label, trace in traces.items()}))
+
+    with st.expander("Bayesian D-error (Db) with priors"):
+        st.write("D-error averaged over Halton draws from normal priors on the coefficients (per SEK / per km).")
+        priors = {}
+        for name, (prior_mean, prior_sd) in DEFAULT_PRIORS.items():
+            if name not in design_params:
+                continue
+            c1, c2 = st.columns(2)
+            prior_mean = c1.number_input(f"{name}: prior mean", value=prior_mean, format="%.4f")
+            prior_sd = c2.number_input(f"{name}: prior sd", value=prior_sd, min_value=0.0, format="%.4f")
+            priors[name] = (prior_mean, prior_sd)
+        n_draws = st.number_input("Halton draws", value=2_000, min_value=100, step=500)
+        db_error = BayesianDError(design_params, priors, n_draws=n_draws).evaluate(design_X)
+        st.metric("Db-error", f"{db_error:.4f}")
     st.caption("The table below shows exactly what to display to the respondent.")
 
     # Create a simplified view for the user
@@ -186,11 +257,27 @@ else:
         'Locker_Display', 'Locker_Is_Green',
         'Home_Display', 'Home_Is_Green'
     ]
+    if "Block" in final_design.columns:
+        display_view_cols = ['Block'] + display_view_cols
     
     st.dataframe(final_design[display_view_cols], use_container_width=True)
 
     # --- 5. DETAILED DATA & EXPORT ---
     
+    with st.expander("Design diagnostics"):
+        # Computed once per generated design, then served with it from the design cache
+        diagnostics, _ = get_design_cache().get_or_build(
+            design_cache_key(report="diagnostics", design=cache_key), lambda: design_diagnostics(final_design))
+        st.write("**Level frequencies** (share among the scenarios that show the attribute; "
+                 "a FREE offer hides its price and threshold)")
+        st.dataframe(diagnostics.level_frequencies(), hide_index=True)
+        st.write("**Association between attributes** (Cramér's V: 0 = independent, 1 = confounded)")
+        st.dataframe(diagnostics.correlations().round(2))
+        st.write("**Attribute overlap** (share of alternative pairs with the same value)")
+        st.dataframe(pd.Series(diagnostics.overlap_summary(), name="Value"))
+        st.write("**Top-up gaps per basket** (0 = FREE)")
+        st.dataframe(diagnostics.gap_distribution(), hide_index=True)
+
     with st.expander("View Underlying Data (Prices & Gaps)"):
         st.write("This data contains the raw numbers for your analysis.")
         st.dataframe(final_design)
@@ -0,0 +1,55 @@
+"""
+Level balance of a design: how evenly every level of every attribute is shown.
+
+Rows are counted per (attribute, level) pair in one flat count vector. The
+price and threshold of a FREE offer are not shown to the respondent, so
+they are counted in a separate "hidden" slot per attribute that the
+balance ignores.
+"""
+import numpy as np
+
+from design_engine import OFFER_NESTS
+
+
+def hide_free_slots(slots, columns, is_free, hidden_offset):
+    """
+    Moves the price and threshold of every FREE offer (is_free: nest -> bool
+    per row) to the hidden slot hidden_offset + attribute position, in place.
+    `columns` are the attributes of the columns of `slots`.
+    """
+    position = {col: i for i, col in enumerate(columns)}
+    for nest, free in is_free.items():
+        for col in (f"{nest}_Price", f"{nest}_Threshold"):
+            if col in position:
+                slots[free, position[col]] = hidden_offset + position[col]
+    return slots
+
+
+def flat_level_codes(design):
+    """
+    (n_rows, n_attributes) slot numbers of a CodedDesign: level code + offset
+    of the attribute, or n_levels + attribute for a hidden price/threshold.
+    """
+    radices = design.space.radices
+    offsets = np.concatenate([[0], np.cumsum(radices)[:-1]])
+    flat = design.codes.astype(np.int64) + offsets
+    is_free = {nest: design.offers(nest)[1] == 0 for nest in OFFER_NESTS}
+    return hide_free_slots(flat, design.space.columns, is_free, int(radices.sum()))
+
+
+def balance_targets(counts, radices):
+    """Even split of the visible rows over the levels of each attribute; hidden slots are always on target."""
+    n_levels = int(radices.sum())
+    visible = np.add.reduceat(counts[:n_levels], np.concatenate([[0], np.cumsum(radices)[:-1]]))
+    return np.concatenate([np.repeat(visible / radices, radices), counts[n_levels:]])
+
+
+def balance_objective(counts, radices):
+    """sum((count - target)^2) over the shown (attribute, level) pairs: 0 for a perfectly balanced design."""
+    return float(((counts - balance_targets(counts, radices)) ** 2).sum())
+
+
+def level_imbalance(counts, radices):
+    """Largest gap between the most and the least shown level of any attribute."""
+    splits = np.split(counts[:int(radices.sum())], np.cumsum(radices)[:-1])
+    return max(int(c.max() - c.min()) for c in splits)
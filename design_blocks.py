@@ -0,0 +1,105 @@
+"""
+Splits a design into respondent blocks that look alike.
+
+Every block should show every attribute level in the same proportion as the
+whole design, so the block a respondent gets is uncorrelated with the
+attributes. For block b and attribute level l the ideal count is
+size_b * share_l; the optimizer minimizes
+
+    sum over blocks, attributes and levels of (count - ideal)^2
+
+by swapping rows between blocks. Block sizes never change, and a swap only
+moves four counts per attribute, so its effect is known in O(1):
+with d = count - ideal, moving row r (level x) from block a to block b and
+row s (level y) from b to a changes the sum by
+
+    2 * (d[a, y] - d[a, x] + d[b, x] - d[b, y]) + 4      (x != y)
+
+and all swaps of one row are scored in a single array operation.
+"""
+import numpy as np
+import pandas as pd
+
+# Attributes that must not differ between blocks (those present in the design are used)
+BLOCK_ATTRIBUTES = [
+    'Context_Label',
+    'Locker_Price', 'Locker_Threshold', 'Locker_Exp_Price', 'Locker_Is_Green', 'Locker_Distance',
+    'Home_Price', 'Home_Threshold', 'Home_Exp_Price', 'Home_Is_Green',
+    'Shop_Price', 'Shop_Threshold', 'Shop_Is_Green', 'Shop_Distance',
+]
+
+
+def _slot_codes(design, attributes):
+    """(n_rows, n_attributes) slot numbers: one slot per (attribute, level), counted from 0."""
+    codes, offset = [], 0
+    for col in attributes:
+        col_codes, uniques = pd.factorize(design[col])
+        codes.append(col_codes + offset)
+        offset += len(uniques)
+    return np.column_stack(codes), offset
+
+
+def assign_blocks(design, n_blocks, seed=0, attributes=None, max_passes=50):
+    """
+    Block number (1..n_blocks) for every row of `design`.
+    Blocks differ in size by at most one row.
+    """
+    attributes = [col for col in (attributes or BLOCK_ATTRIBUTES) if col in design.columns]
+    n = len(design)
+    rng = np.random.default_rng(seed)
+    block = np.empty(n, dtype=np.int64)
+    block[rng.permutation(n)] = np.arange(n) % n_blocks
+    if n_blocks <= 1 or not attributes:
+        return block + 1
+
+    slots, n_slots = _slot_codes(design, attributes)
+    sizes = np.bincount(block, minlength=n_blocks)
+    shares = np.bincount(slots.ravel(), minlength=n_slots) / n
+
+    counts = np.zeros((n_blocks, n_slots))
+    np.add.at(counts, (np.repeat(block, len(attributes)), slots.ravel()), 1)
+    d = counts - sizes[:, None] * shares[None, :]
+
+    for _ in range(max_passes):
+        improved = False
+        for r in range(n):
+            a, x = block[r], slots[r]  # block and (n_attributes,) slots of row r
+            # Score swapping r with every row s at once (block[s], slots[s] as arrays)
+            change = 2 * (d[a, slots] - d[a, x] + d[block[:, None], x] - d[block[:, None], slots]) + 4
+            change[slots == x] = 0
+            delta = change.sum(axis=1)
+            delta[block == a] = np.inf
+
+            s = int(np.argmin(delta))
+            if delta[s] >= -1e-9:
+                continue
+
+            # Swap r <-> s and move their counts (ideal counts do not change)
+            b, y = block[s], slots[s]
+            d[a, x] -= 1
+            d[b, x] += 1
+            d[b, y] -= 1
+            d[a, y] += 1
+            block[r], block[s] = b, a
+            improved = True
+        if not improved:
+            break
+    return block + 1
+
+
+def block_correlations(design, blocks, attributes=None):
+    """
+    Largest |correlation| between any block indicator and any level dummy,
+    per attribute. 0 = the attribute is spread perfectly evenly over the blocks.
+    """
+    attributes = [col for col in (attributes or BLOCK_ATTRIBUTES) if col in design.columns]
+    block_dummies = pd.get_dummies(pd.Series(blocks), dtype=float).to_numpy()
+    result = {}
+    for col in attributes:
+        level_dummies = pd.get_dummies(design[col].reset_index(drop=True), dtype=float).to_numpy()
+        if level_dummies.shape[1] < 2 or block_dummies.shape[1] < 2:
+            result[col] = 0.0
+            continue
+        corr = np.corrcoef(block_dummies.T, level_dummies.T)[:block_dummies.shape[1], block_dummies.shape[1]:]
+        result[col] = float(np.nanmax(np.abs(corr)))
+    return pd.Series(result, name="max_abs_corr")
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Bump when the generation logic changes, so old cached designs are not served
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".design_cache")
+
+
+def design_cache_key(**inputs):
+    """
+    Content address of a design: SHA-256 of the generation inputs
+    (attribute levels, contexts, n_small/n_big, seed, mode, ...).
+    """
+    payload = json.dumps({"version": CACHE_VERSION, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DesignCache:
+    """
+    Two-tier cache for generated designs.
+
+    Tier 1 is an in-memory LRU of at most `max_items` entries. Tier 2 is a
+    directory of pickles, one file per key, capped at `max_disk_bytes`; the
+    least recently used files are evicted first (reads refresh the mtime).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_items=32, max_disk_bytes=256 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    # --- Memory tier ---
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    # --- Public API ---
+
+    def get(self, key):
+        """Returns (value, source) with source "memory", "disk" or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key], "memory"
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None, None
+
+        os.utime(path)  # mark as recently used for the disk eviction
+        self._remember(key, value)
+        return value, "disk"
+
+    def put(self, key, value):
+        self._remember(key, value)
+
+        # Write to a temp file first so a crash never leaves a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def get_or_build(self, key, builder):
+        """Returns (value, source); source is "built" when `builder()` had to run."""
+        value, source = self.get(key)
+        if source is not None:
+            return value, source
+        value = builder()
+        self.put(key, value)
+        return value, "built"
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _evict_disk(self):
+        """Deletes least recently used files until the directory fits in max_disk_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
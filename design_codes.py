@@ -0,0 +1,310 @@
+import math
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from design_constraints import ConstraintSet, enumeration_peak_rows, filtered_indices
+from design_dominance import dominance_counts, dominance_table
+from design_engine import (EXPRESS_NESTS, OFFER_NESTS, calculate_scenario_logic, combine_codes, compute_offers,
+                           first_occurrence, logic_filter_mask, visual_key_radices)
+from design_space import PERMUTATION_LIMIT
+
+
+class _DecodedColumns(Mapping):
+    """Read-only column view of a CodedDesign; values are decoded on access."""
+
+    def __init__(self, design):
+        self.design = design
+
+    def __getitem__(self, col):
+        return self.design.values(col)
+
+    def __iter__(self):
+        return iter(self.design.space.columns)
+
+    def __len__(self):
+        return len(self.design.space.columns)
+
+
+class CodedDesign:
+    """
+    Design rows stored as level codes of a DesignSpace.
+
+    Every attribute is one small unsigned integer per row (uint8 for fewer
+    than 256 levels) plus the row number in the full factorial. Prices,
+    thresholds, labels and display strings are looked up from the level
+    lists only when needed, and to_frame() materializes the full export
+    frame for just the rows that are kept.
+    """
+
+    def __init__(self, space, index, ctx, constraints=None, codes=None):
+        self.space = space
+        self.index = np.asarray(index, dtype=np.int64)
+        self.codes = space.decode_codes(self.index) if codes is None else codes
+        self.ctx = ctx
+        self.constraints = constraints
+        self._position = {col: i for i, col in enumerate(space.columns)}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return f"CodedDesign({len(self):,} rows, {self.nbytes / 1024 ** 2:.1f} MB, {self.ctx['label']})"
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.index.nbytes
+
+    # --- Column access ---
+
+    def column_codes(self, col):
+        return self.codes[:, self._position[col]]
+
+    def values(self, col):
+        return self.space.level_values[self._position[col]][self.column_codes(col)]
+
+    def offers(self, nest):
+        """(final_cost, topup_gap) of one nest for this design's basket."""
+        final_cost, topup_gap = self.offer_matrix(nest, [self.ctx['val']])
+        return final_cost[:, 0], topup_gap[:, 0]
+
+    def offer_matrix(self, nest, cart_values):
+        """
+        (final_cost, topup_gap) of one nest for every row x every cart value,
+        as (n_rows, n_carts) arrays. Offers are computed once per
+        (price level, threshold level, cart) and broadcast to the rows.
+        """
+        cart_values = np.asarray(cart_values, dtype=np.int64)
+        prices = self.space.level_values[self._position[f"{nest}_Price"]]
+        thresholds = self.space.level_values[self._position[f"{nest}_Threshold"]]
+        cost_table, gap_table = np.broadcast_arrays(
+            *compute_offers(prices[:, None, None], thresholds[None, :, None], cart_values[None, None, :])
+        )
+        price_code, threshold_code = self.column_codes(f"{nest}_Price"), self.column_codes(f"{nest}_Threshold")
+        return cost_table[price_code, threshold_code], gap_table[price_code, threshold_code]
+
+    # --- Row selection ---
+
+    def with_context(self, ctx):
+        """Same rows (shared arrays, no copy) under another basket context."""
+        return CodedDesign(self.space, self.index, ctx, self.constraints, codes=self.codes)
+
+    def take(self, rows):
+        rows = np.asarray(rows)
+        return CodedDesign(self.space, self.index[rows], self.ctx, self.constraints, codes=self.codes[rows])
+
+    def apply_filters(self):
+        """Keeps the rows that pass the logic filters (or the constraint set)."""
+        if self.constraints is None:
+            gaps = {nest: self.offers(nest)[1] for nest in OFFER_NESTS}
+            keep = logic_filter_mask(gaps["Locker"], gaps["Home"], gaps["Shop"])
+        else:
+            keep = self.constraints.mask(_DecodedColumns(self), self.ctx['val'])
+        return self.take(np.flatnonzero(keep))
+
+    def display_codes(self, display_cols):
+        """
+        Small-integer version of every display column: equal codes <=> equal
+        strings on screen.
+        """
+        codes = {}
+        for col in display_cols:
+            nest = col.split("_", 1)[0]
+            if col == f"{nest}_Display" and nest in OFFER_NESTS:
+                # "FREE" -> 0, otherwise one code per (price level, threshold level)
+                n_thresholds = int(self.space.radices[self._position[f"{nest}_Threshold"]])
+                price_code = self.column_codes(f"{nest}_Price").astype(np.int32)
+                threshold_code = self.column_codes(f"{nest}_Threshold").astype(np.int32)
+                is_free = self.offers(nest)[1] == 0
+                codes[col] = np.where(is_free, 0, 1 + price_code * n_thresholds + threshold_code)
+            elif col == f"{nest}_Exp_Display" and nest in EXPRESS_NESTS:
+                codes[col] = self.column_codes(f"{nest}_Exp_Price")
+            else:
+                codes[col] = self.column_codes(col)
+        return codes
+
+    def visual_keys(self, display_cols):
+        """Same uint64 keys as design_engine.visual_keys() on the materialized frame."""
+        codes = self.display_codes(display_cols)
+        return combine_codes([codes[col] for col in display_cols], visual_key_radices(display_cols, self.space.levels))
+
+    def drop_visual_duplicates(self, display_cols):
+        """Keeps the first row of every "Unique Visual Scenario" (same rule as drop_duplicates)."""
+        return self.take(np.flatnonzero(first_occurrence(self.visual_keys(display_cols))))
+
+    def sample(self, n, random_state):
+        """Same rows as DataFrame.sample(n=n, random_state=random_state) on the materialized frame."""
+        positions = pd.RangeIndex(len(self)).to_series().sample(n=n, random_state=random_state).to_numpy()
+        return self.take(positions)
+
+    # --- Export ---
+
+    def to_frame(self):
+        """Materializes the export frame (prices, context, costs, gaps, display strings)."""
+        frame = self.space.decode(self.index)
+        frame['Context_Cart_Value'] = self.ctx['val']
+        frame['Context_Label'] = self.ctx['label']
+        return calculate_scenario_logic(frame, self.ctx['val'], self.constraints)
+
+
+# --- MANY BASKET CONTEXTS AT ONCE ---
+
+def free_signature(space, cart_value, constraints=None):
+    """
+    Which threshold levels the cart reaches, per nest.
+
+    The filters and the visual duplicates only depend on whether each
+    option is free, so baskets with the same signature keep exactly the
+    same rows. Rules that read the cart amount itself make every basket
+    its own signature.
+    """
+    if constraints is not None and constraints.cart_sensitive:
+        return ("cart", cart_value)
+    position = {col: i for i, col in enumerate(space.columns)}
+    return tuple(
+        tuple(space.level_values[position[f"{nest}_Threshold"]] <= cart_value) for nest in OFFER_NESTS
+    )
+
+
+def unique_visuals_per_context(space, contexts, display_cols, constraints=None):
+    """
+    Filtered, de-duplicated candidates for every basket context, as CodedDesigns.
+
+    Baskets are grouped by free_signature and the work runs once per group;
+    every basket in a group gets a view on the same rows (shared, not copied).
+    With the built-in filters, the gaps and filter masks of all groups come
+    from one (rows x groups) broadcast. 50 basket values cost about as much
+    as the handful of distinct signatures they fall into.
+    """
+    groups = {}
+    for i, ctx in enumerate(contexts):
+        groups.setdefault(free_signature(space, ctx['val'], constraints), []).append(i)
+    representatives = [contexts[members[0]] for members in groups.values()]
+
+    if constraints is None:
+        everything = CodedDesign(space, np.arange(space.size), representatives[0])
+        carts = [ctx['val'] for ctx in representatives]
+        gaps = {nest: everything.offer_matrix(nest, carts)[1] for nest in OFFER_NESTS}
+        masks = logic_filter_mask(gaps["Locker"], gaps["Home"], gaps["Shop"])
+        candidates = [everything.take(np.flatnonzero(masks[:, g])).with_context(ctx)
+                      for g, ctx in enumerate(representatives)]
+    else:
+        candidates = [CodedDesign(space, filtered_indices(space, constraints, ctx['val']), ctx, constraints)
+                      for ctx in representatives]
+
+    results = [None] * len(contexts)
+    for members, group_candidates in zip(groups.values(), candidates):
+        unique = group_candidates.drop_visual_duplicates(display_cols)
+        for i in members:
+            results[i] = unique.with_context(contexts[i])
+    return results
+
+
+def factorial_dominance_report(space, ctx, near=False, batch_rows=250_000):
+    """
+    dominance_report() of the whole full factorial for one basket, decoded
+    and counted in batches of consecutive rows, so memory stays bounded by
+    `batch_rows` whatever the size of the space.
+    """
+    per_pair, total = None, 0
+    for start in range(0, space.size, batch_rows):
+        rows = np.arange(start, min(start + batch_rows, space.size), dtype=np.int64)
+        batch_pairs, batch_total = dominance_counts(_DecodedColumns(CodedDesign(space, rows, ctx)), ctx['val'], near)
+        per_pair = batch_pairs if per_pair is None else per_pair + batch_pairs
+        total += batch_total
+    return dominance_table(per_pair, total, near=near)
+
+
+# --- REJECTION SAMPLING FOR LARGE SPACES ---
+
+def _enumerated_in_draw_order(space, ctx, display_cols, n, seed, constraints=None):
+    """
+    The rows rejection_sample() would return, found by enumerating the
+    filtered space: filtered rows in the order of the seed's permutation,
+    first row of every visual scenario, first n. Above PERMUTATION_LIMIT
+    there is no permutation to follow, so the filtered rows are shuffled
+    with the seed instead.
+    """
+    # The default constraint set is the same as the built-in logic filters
+    indices = filtered_indices(space, constraints or ConstraintSet(), ctx['val'])
+    passed = CodedDesign(space, indices, ctx, constraints)
+    if space.size <= PERMUTATION_LIMIT:
+        order = np.random.default_rng(seed).permutation(space.size)  # the draw order of iter_index_batches
+        rank = np.empty(space.size, dtype=np.int64)
+        rank[order] = np.arange(space.size)
+        shuffled = np.argsort(rank[passed.index], kind="stable")
+    else:
+        shuffled = np.random.default_rng(seed).permutation(len(passed))
+    unique = passed.take(shuffled).drop_visual_duplicates(display_cols)
+    return unique.take(np.arange(min(n, len(unique))))
+
+
+def rejection_sample(space, ctx, display_cols, n, seed, batch_size=65_536, constraints=None, min_acceptance=0.02,
+                     max_draws=None):
+    """
+    `n` visually unique scenarios that pass the filters, drawn uniformly from
+    `space` without enumerating it.
+
+    Random row numbers are drawn in batches; offers, filters and visual keys
+    are computed on the level codes of the whole batch at once, and new
+    visual scenarios are kept in draw order until `n` are found. When fewer
+    than `min_acceptance` of the draws pass the filters and the space can be
+    permuted in memory, the filtered space is enumerated (pruned) instead;
+    that gives the same rows as sampling on, just faster.
+
+    Larger spaces are drawn with replacement, which never runs dry, so the
+    draws stop after `max_draws` (default: 20 x n / min_acceptance). If the
+    filters passed fewer than `min_acceptance` of them by then, the filtered
+    space is enumerated with the pruned filtered_indices(), provided its
+    largest prefix table is estimated to stay within PERMUTATION_LIMIT rows;
+    otherwise fewer than `n` visual scenarios are returned, with a
+    stats["warning"].
+
+    Returns (CodedDesign, stats) with stats: method ("sampling" or
+    "enumeration"), drawn, accepted, acceptance_rate and, when the sample
+    falls short on rare filters, a warning.
+    """
+    rng = np.random.default_rng(seed)
+    seen_keys = np.empty(0, dtype=np.uint64)
+    found_index, found_codes = [], []
+    n_found = drawn = accepted = 0
+    stats = {"method": "sampling"}
+    if max_draws is None and space.size > PERMUTATION_LIMIT:
+        max_draws = max(batch_size, math.ceil(20 * n / min_acceptance))
+
+    for indices in space.iter_index_batches(batch_size, rng, max_draws):
+        passed = CodedDesign(space, indices, ctx, constraints).apply_filters()
+        drawn += len(indices)
+        accepted += len(passed)
+
+        keys = passed.visual_keys(display_cols)
+        is_new = first_occurrence(keys) & ~np.isin(keys, seen_keys)
+        new_rows = np.flatnonzero(is_new)[:n - n_found]
+        found_index.append(passed.index[new_rows])
+        found_codes.append(passed.codes[new_rows])
+        seen_keys = np.union1d(seen_keys, keys[is_new])
+        n_found += len(new_rows)
+        if n_found >= n:
+            break
+
+        if accepted < min_acceptance * drawn and space.size <= PERMUTATION_LIMIT and drawn < space.size:
+            stats.update(method="enumeration", drawn=drawn, accepted=accepted, acceptance_rate=accepted / drawn)
+            return _enumerated_in_draw_order(space, ctx, display_cols, n, seed, constraints), stats
+
+    if n_found < n and drawn < space.size and accepted < min_acceptance * drawn:
+        # Draws ran out on rare (or unsatisfiable) filters: enumerate the pruned filtered space,
+        # unless the rules prune too late for the prefixes to fit in memory
+        sample = np.random.default_rng(seed).integers(0, space.size, size=batch_size, dtype=np.int64)
+        peak = enumeration_peak_rows(space, constraints or ConstraintSet(), ctx['val'], sample)
+        if peak <= PERMUTATION_LIMIT:
+            stats.update(method="enumeration", drawn=drawn, accepted=accepted, acceptance_rate=accepted / max(drawn, 1))
+            return _enumerated_in_draw_order(space, ctx, display_cols, n, seed, constraints), stats
+        stats["warning"] = (f"Warning: Only {accepted:,} of {drawn:,} random draws pass the filters for {ctx['label']} "
+                            f"and enumerating them would hold about {peak:,.0f} rows, so only the {n_found} "
+                            f"scenarios found by sampling are used.")
+
+    stats.update(drawn=drawn, accepted=accepted, acceptance_rate=accepted / max(drawn, 1))
+    if not found_index:
+        return CodedDesign(space, np.empty(0, dtype=np.int64), ctx, constraints), stats
+    return CodedDesign(space, np.concatenate(found_index), ctx, constraints, codes=np.concatenate(found_codes)), stats
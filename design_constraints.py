@@ -0,0 +1,333 @@
+import ast
+import operator
+
+import numpy as np
+
+from design_dominance import DOMINANCE_COLUMNS, OPTIONAL_COLUMNS, dominated_mask
+from design_engine import OFFER_NESTS, compute_offers
+
+# --- 1. THE CONSTRAINT LANGUAGE ---
+#
+# One rule per line; every kept scenario must satisfy all rules.
+#   * Python-style expressions: and / or / not, == != < <= > >=, in [...], + - * /
+#   * "A -> B" means "if A then B"
+#   * Names: any attribute column (Locker_Price, Shop_Distance, ...), Cart, and
+#     per nest the derived <Nest>_Final_Cost, <Nest>_TopUp_Gap and <Nest>_Is_Free
+#   * Is_Dominated / Is_Near_Dominated: some alternative is (near-)dominated by
+#     another one (see design_dominance), e.g. "not Is_Dominated"
+#   * Everything after "#" is a comment
+
+DEFAULT_CONSTRAINTS = """\
+# Filter 1: Eliminate Double Free (Home vs Locker)
+not (Home_Is_Free and Locker_Is_Free)
+# Filter 2: Enforce Hierarchy - if Locker is Free, Shop MUST be Free
+Locker_Is_Free -> Shop_Is_Free
+# Filter 3: Enforce Hierarchy - if Home is Free, Locker MUST be Free
+Home_Is_Free -> Locker_Is_Free
+"""
+
+_DERIVED_SUFFIXES = ("_Final_Cost", "_TopUp_Gap", "_Is_Free")
+
+_DOMINANCE_NAMES = {"Is_Dominated": False, "Is_Near_Dominated": True}  # name -> near
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+
+_BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub,
+    ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+
+class ConstraintError(ValueError):
+    """Raised for a rule that cannot be parsed or uses unknown names."""
+
+
+def _base_columns(name):
+    """Attribute columns a name depends on (derived offer names -> price + threshold)."""
+    for nest in OFFER_NESTS:
+        if name in (f"{nest}{suffix}" for suffix in _DERIVED_SUFFIXES):
+            return {f"{nest}_Price", f"{nest}_Threshold"}
+    if name == "Cart":
+        return set()
+    if name in _DOMINANCE_NAMES:
+        return DOMINANCE_COLUMNS | OPTIONAL_COLUMNS
+    return {name}
+
+
+def _compile_node(node, names):
+    """Turns an AST node into a function env -> array. Collects the names it reads."""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, names)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(v, names) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        def bool_op(env):
+            result = np.asarray(parts[0](env), dtype=bool)
+            for part in parts[1:]:
+                result = combine(result, part(env))
+            return result
+        return bool_op
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = _compile_node(node.operand, names)
+        return lambda env: np.logical_not(inner(env))
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        inner = _compile_node(node.operand, names)
+        return lambda env: -inner(env)
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left, names)
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _compile_node(comparator, names)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                negate = isinstance(op, ast.NotIn)
+                steps.append((lambda a, b, negate=negate: np.isin(a, b, invert=negate), right))
+            elif type(op) in _COMPARE_OPS:
+                steps.append((_COMPARE_OPS[type(op)], right))
+            else:
+                raise ConstraintError(f"Unsupported comparison: {type(op).__name__}")
+        def compare(env):
+            result, a = True, left(env)
+            for func, right in steps:
+                b = right(env)
+                result = np.logical_and(result, func(a, b))
+                a = b
+            return result
+        return compare
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        func = _BIN_OPS[type(node.op)]
+        left, right = _compile_node(node.left, names), _compile_node(node.right, names)
+        return lambda env: func(left(env), right(env))
+
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+        return lambda env, name=node.id: env[name]
+
+    if isinstance(node, ast.Constant):
+        return lambda env, value=node.value: value
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile_node(e, names) for e in node.elts]
+        return lambda env: [item(env) for item in items]
+
+    raise ConstraintError(f"Unsupported syntax: {ast.dump(node)[:60]}")
+
+
+class Constraint:
+    """One compiled rule."""
+
+    def __init__(self, text):
+        self.text = text.strip()
+        expression = self.text
+        if "->" in expression:
+            condition, consequence = expression.split("->", 1)
+            expression = f"(not ({condition})) or ({consequence})"
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise ConstraintError(f"Cannot parse rule '{self.text}': {e.msg}") from e
+
+        self.names = set()
+        self._evaluate = _compile_node(tree, self.names)
+        self.columns = set().union(*(_base_columns(n) for n in self.names)) if self.names else set()
+
+    def __repr__(self):
+        return f"Constraint({self.text!r})"
+
+    def evaluate(self, env):
+        return np.asarray(self._evaluate(env), dtype=bool)
+
+
+class _Environment(dict):
+    """Column lookup that derives the offer names (gaps, costs, free flags) on first use."""
+
+    def __init__(self, columns, cart_value):
+        super().__init__()
+        self.columns = columns
+        self.cart_value = cart_value
+
+    def __missing__(self, name):
+        if name == "Cart":
+            return self.cart_value
+        if name in _DOMINANCE_NAMES:
+            value = dominated_mask(self.columns, self.cart_value, near=_DOMINANCE_NAMES[name])
+            self[name] = value
+            return value
+        for nest in OFFER_NESTS:
+            if name.startswith(f"{nest}_") and name.endswith(_DERIVED_SUFFIXES):
+                final_cost, topup_gap = compute_offers(
+                    self[f"{nest}_Price"], self[f"{nest}_Threshold"], self.cart_value
+                )
+                self[f"{nest}_Final_Cost"] = final_cost
+                self[f"{nest}_TopUp_Gap"] = topup_gap
+                self[f"{nest}_Is_Free"] = topup_gap == 0
+                return self[name]
+        try:
+            value = self.columns[name]
+        except KeyError:
+            raise ConstraintError(f"Unknown name in constraint: {name}") from None
+        value = np.asarray(value)
+        self[name] = value
+        return value
+
+
+class ConstraintSet:
+    """
+    A list of rules compiled to vectorized masks. With `columns` (the
+    attribute columns of the design) a rule that reads an unknown name is
+    rejected here, not when it is first evaluated.
+    """
+
+    def __init__(self, text=DEFAULT_CONSTRAINTS, columns=None):
+        self.text = text
+        self.constraints = []
+        # The green and distance columns of the dominance check are optional
+        known = None if columns is None else set(columns) | OPTIONAL_COLUMNS
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            rule = line.split("#", 1)[0].strip()
+            if not rule:
+                continue
+            try:
+                constraint = Constraint(rule)
+                if known is not None and constraint.columns - known:
+                    raise ConstraintError(
+                        f"Unknown name in constraint: {', '.join(sorted(constraint.columns - known))}")
+            except ConstraintError as e:
+                raise ConstraintError(f"Line {line_no}: {e}") from None
+            self.constraints.append(constraint)
+
+    def __len__(self):
+        return len(self.constraints)
+
+    @property
+    def columns(self):
+        """All attribute columns the rules depend on."""
+        return set().union(*(c.columns for c in self.constraints)) if self.constraints else set()
+
+    @property
+    def cart_sensitive(self):
+        """
+        True when a rule reads the cart amount itself (Cart, a top-up gap or a
+        dominance flag), not just which thresholds the cart reaches
+        (<Nest>_Is_Free / _Final_Cost).
+        """
+        amount_names = {"Cart"} | {f"{nest}_TopUp_Gap" for nest in OFFER_NESTS} | set(_DOMINANCE_NAMES)
+        return any(c.names & amount_names for c in self.constraints)
+
+    def mask(self, columns, cart_value):
+        """
+        True for every row that satisfies all rules.
+        `columns` is anything indexable by column name (a DataFrame, a dict of arrays).
+        """
+        env = _Environment(columns, cart_value)
+        keep = True
+        for constraint in self.constraints:
+            keep = keep & constraint.evaluate(env)
+        return np.broadcast_to(keep, (len(columns[next(iter(columns.keys()))]),)).copy()
+
+
+def load_constraints(path, columns=None):
+    """Reads a constraint file (same format as DEFAULT_CONSTRAINTS)."""
+    with open(path, encoding="utf-8") as f:
+        return ConstraintSet(f.read(), columns)
+
+
+# --- 2. PRUNED ENUMERATION ---
+
+def _enumeration_order(space, constraints):
+    """
+    Attribute order for the prefix tree: constrained attributes first, picked
+    so that rules become decidable as early as possible; free attributes last.
+    """
+    order = []
+    pending = sorted(constraints.constraints, key=lambda c: len(c.columns))
+    while pending:
+        # Close the rule that needs the fewest new attributes
+        pending.sort(key=lambda c: len(c.columns - set(order)))
+        rule = pending.pop(0)
+        order += [col for col in space.columns if col in rule.columns and col not in order]
+    order += [col for col in space.columns if col not in order]
+    return order
+
+
+def enumeration_peak_rows(space, constraints, cart_value, sample_indices):
+    """
+    Estimated largest number of prefix rows filtered_indices() holds at once,
+    from a uniform random sample of row numbers of `space`: a prefix passes
+    the rules checked so far as often as a random full row does. Rules that
+    read late attributes (e.g. Is_Dominated reads every price) leave the
+    prefix unpruned up to that attribute.
+    """
+    order = _enumeration_order(space, constraints)
+    position = {col: i for i, col in enumerate(space.columns)}
+    codes = space.decode_codes(sample_indices)
+    env = _Environment({col: space.level_values[i][codes[:, i]] for col, i in position.items()}, cart_value)
+
+    passing = np.ones(len(codes), dtype=bool)
+    pending = list(constraints.constraints)
+    prefix_cols, prefix_size, peak = set(), 1, 0.0
+    for col in order:
+        prefix_size *= int(space.radices[position[col]])
+        peak = max(peak, prefix_size * passing.mean())
+        prefix_cols.add(col)
+        for rule in [c for c in pending if c.columns & set(space.columns) <= prefix_cols]:
+            passing &= rule.evaluate(env)
+            pending.remove(rule)
+    return peak
+
+
+def filtered_indices(space, constraints, cart_value):
+    """
+    Row numbers (sorted) of the full factorial of `space` that satisfy
+    `constraints`, found without enumerating the rejected sub-trees.
+
+    Attributes are added to a prefix one at a time; as soon as every column
+    of a rule is in the prefix, the rule is checked and failing prefixes are
+    dropped together with all their completions. Attributes no rule mentions
+    are crossed in only at the end.
+    """
+    # The green and distance columns of the dominance check are optional
+    unknown = constraints.columns - set(space.columns) - OPTIONAL_COLUMNS
+    if unknown:
+        raise ConstraintError(f"Unknown name in constraint: {', '.join(sorted(unknown))}")
+    order = _enumeration_order(space, constraints)
+    position = {col: i for i, col in enumerate(space.columns)}
+
+    prefix_codes = np.zeros((1, 0), dtype=space.code_dtype)
+    prefix_cols = []
+    pending = list(constraints.constraints)
+
+    for col in order:
+        i = position[col]
+        radix = int(space.radices[i])
+        # Extend every surviving prefix with every level of the next attribute
+        prefix_codes = np.hstack([
+            np.repeat(prefix_codes, radix, axis=0),
+            np.tile(np.arange(radix, dtype=space.code_dtype), len(prefix_codes))[:, None],
+        ])
+        prefix_cols.append(col)
+
+        ready = [c for c in pending if c.columns & set(space.columns) <= set(prefix_cols)]
+        if ready:
+            env = _Environment({name: space.level_values[position[name]][prefix_codes[:, j]]
+                                for j, name in enumerate(prefix_cols)}, cart_value)
+            keep = np.ones(len(prefix_codes), dtype=bool)
+            for rule in ready:
+                keep &= rule.evaluate(env)
+                pending.remove(rule)
+            prefix_codes = prefix_codes[keep]
+
+    # Back to the original column order -> row numbers of the full factorial
+    codes = np.empty_like(prefix_codes)
+    for j, col in enumerate(prefix_cols):
+        codes[:, position[col]] = prefix_codes[:, j]
+    return np.sort(space.encode_codes(codes))
+
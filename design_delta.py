@@ -0,0 +1,155 @@
+"""
+Candidate sets that follow the sidebar: when the attribute levels change,
+only the rows that involve a new level are filtered; the rest is carried
+over from the previous levels.
+
+The filters look at one row at a time, so a row that passed before still
+passes when it exists in the new space. After a level change the filtered
+rows are
+
+    old filtered rows whose levels are all still selected (re-coded)
+    + filtered rows that use at least one new level
+
+The second part is split into disjoint sub-spaces (attribute a takes a new
+level, the attributes before it only old ones) and each is filtered on its
+own with the usual pruned enumeration. Rows are then sorted by their number
+in the new full factorial, so de-duplication and sampling see exactly the
+same candidates as a build from scratch.
+"""
+import numpy as np
+
+from design_codes import CodedDesign, free_signature
+from design_constraints import filtered_indices
+from design_space import DesignSpace
+
+
+def _filtered_codes(space, cart_value, constraints=None):
+    """(n_rows, n_attributes) level codes of the rows of `space` that pass the filters, in full-factorial order."""
+    if constraints is None:
+        everything = CodedDesign(space, np.arange(space.size), {"val": cart_value, "label": ""})
+        return everything.apply_filters().codes
+    return space.decode_codes(filtered_indices(space, constraints, cart_value))
+
+
+class IncrementalCandidates:
+    """
+    Filtered (not yet de-duplicated) candidates of the last design space,
+    per cart value, patched by update() when the levels change.
+
+        candidates = IncrementalCandidates()
+        candidates.update(levels, constraints)
+        unique_per_context = candidates.unique_visuals_per_context(contexts, display_cols)
+    """
+
+    def __init__(self):
+        self.space = None
+        self.constraints = None
+        self._filtered = {}  # cart value -> (row numbers, (n_rows, n_attributes) level codes), sorted
+        self.last_update = None
+
+    def update(self, levels, constraints=None):
+        """
+        Moves to new attribute levels. Returns (and keeps in last_update) the
+        rows carried over, removed and added, summed over the cached carts.
+        New attributes or other rules start from scratch.
+        """
+        space = DesignSpace(levels)
+        same_rules = (None if constraints is None else constraints.text) == \
+                     (None if self.constraints is None else self.constraints.text)
+        if self.space is None or space.columns != self.space.columns or not same_rules:
+            self._filtered = {}
+            stats = {"rebuilt": True, "kept": 0, "removed": 0, "added": 0}
+        else:
+            stats = self._patch(space, constraints)
+        self.space, self.constraints = space, constraints
+        self.last_update = stats
+        return stats
+
+    def _patch(self, space, constraints):
+        old = self.space
+        # Per attribute: old level code -> new level code (-1: deselected), and the new level codes
+        code_maps, new_codes = [], []
+        for col in space.columns:
+            position = {value: j for j, value in enumerate(space.levels[col])}
+            code_maps.append(np.array([position.get(value, -1) for value in old.levels[col]], dtype=np.int64))
+            old_values = set(old.levels[col])
+            new_codes.append([j for j, value in enumerate(space.levels[col]) if value not in old_values])
+
+        pieces = self._new_level_spaces(space, code_maps, new_codes)
+        # Attributes whose codes stay the same are copied as they are
+        changed = [i for i, code_map in enumerate(code_maps)
+                   if not np.array_equal(code_map, np.arange(len(code_map))) or new_codes[i]]
+
+        stats = {"rebuilt": False, "kept": 0, "removed": 0, "added": 0}
+        for cart, (_, codes) in self._filtered.items():
+            recoded = codes.astype(space.code_dtype)
+            keep = np.ones(len(codes), dtype=bool)
+            for i in changed:
+                new_code = code_maps[i][codes[:, i]]
+                keep &= new_code >= 0
+                recoded[:, i] = np.maximum(new_code, 0)
+            kept = recoded[keep]
+
+            added = []
+            for sub_space, to_new in pieces:
+                sub_codes = _filtered_codes(sub_space, cart, constraints)
+                block = np.empty(sub_codes.shape, dtype=space.code_dtype)
+                for i, sub_to_new in enumerate(to_new):
+                    block[:, i] = sub_to_new[sub_codes[:, i]]
+                added.append(block)
+
+            merged = np.concatenate([kept] + added)
+            index = space.encode_codes(merged)
+            order = np.argsort(index, kind="stable")
+            self._filtered[cart] = (index[order], merged[order])
+            stats["kept"] += len(kept)
+            stats["removed"] += len(codes) - len(kept)
+            stats["added"] += len(merged) - len(kept)
+        return stats
+
+    @staticmethod
+    def _new_level_spaces(space, code_maps, new_codes):
+        """
+        Disjoint sub-spaces covering every row with at least one new level, as
+        (DesignSpace, per attribute: sub-space code -> code in `space`).
+        """
+        kept_codes = [sorted(set(code_map[code_map >= 0].tolist())) for code_map in code_maps]
+        all_codes = [list(range(int(r))) for r in space.radices]
+        pieces = []
+        for a, codes_a in enumerate(new_codes):
+            if not codes_a:
+                continue
+            # Attributes before a: old levels only (rows with a new level there belong to an earlier piece)
+            choice = kept_codes[:a] + [codes_a] + all_codes[a + 1:]
+            if any(len(codes) == 0 for codes in choice):
+                continue
+            sub_levels = {col: [space.levels[col][j] for j in codes] for col, codes in zip(space.columns, choice)}
+            pieces.append((DesignSpace(sub_levels), [np.array(codes, dtype=np.int64) for codes in choice]))
+        return pieces
+
+    def filtered(self, ctx):
+        """Filtered candidates of one basket (computed on first use, patched afterwards)."""
+        if ctx['val'] not in self._filtered:
+            codes = _filtered_codes(self.space, ctx['val'], self.constraints)
+            self._filtered[ctx['val']] = (self.space.encode_codes(codes), codes)
+        index, codes = self._filtered[ctx['val']]
+        return CodedDesign(self.space, index, ctx, self.constraints, codes=codes)
+
+    def unique_visuals_per_context(self, contexts, display_cols):
+        """Same result as design_codes.unique_visuals_per_context() for the current levels."""
+        groups = {}
+        for i, ctx in enumerate(contexts):
+            groups.setdefault(free_signature(self.space, ctx['val'], self.constraints), []).append(i)
+
+        results = [None] * len(contexts)
+        used = set()
+        for members in groups.values():
+            representative = contexts[members[0]]
+            used.add(representative['val'])
+            unique = self.filtered(representative).drop_visual_duplicates(display_cols)
+            for i in members:
+                results[i] = unique.with_context(contexts[i])
+
+        # Only the carts of the current baskets are kept up to date
+        self._filtered = {cart: rows for cart, rows in self._filtered.items() if cart in used}
+        return results
@@ -0,0 +1,211 @@
+"""
+Diagnostics of a design, kept up to date while rows are added and removed.
+
+For a fixed table of candidate rows the running state is a handful of count
+vectors:
+
+    level counts       one slot per (attribute, level); a FREE offer hides
+                       its price and threshold, which count in a "not shown"
+                       slot per attribute
+    co-occurrences     (slots x slots) counts of two levels in one row, from
+                       which every pairwise attribute association follows
+    overlap sums       per generic attribute (cost, gap, green, distance)
+    gap counts         one slot per (basket, nest, top-up gap)
+
+Adding or removing k rows touches k rows of these arrays, so an optimizer
+can update them at every swap; the tables below are derived from the
+counts on request and never rescan the design. The design optimizers keep
+only the level counts (DesignDiagnostics.level_tracker).
+"""
+import numpy as np
+import pandas as pd
+
+from design_balance import hide_free_slots
+from design_engine import OFFER_NESTS
+from design_search import mnl_design_matrix, overlap_per_attribute
+
+# Attributes whose level frequencies and associations are reported (those present are used)
+DIAGNOSTIC_ATTRIBUTES = [
+    'Locker_Price', 'Locker_Threshold', 'Locker_Exp_Price', 'Locker_Is_Green', 'Locker_Distance',
+    'Home_Price', 'Home_Threshold', 'Home_Exp_Price', 'Home_Is_Green',
+    'Shop_Price', 'Shop_Threshold', 'Shop_Is_Green', 'Shop_Distance',
+]
+
+HIDDEN_LEVEL = "(FREE: not shown)"
+
+
+class DesignDiagnostics:
+    """
+    Running diagnostics of a selection of rows of `frame` (a calculated
+    design: attribute columns plus the <Nest>_Final_Cost / _TopUp_Gap
+    columns). Rows are addressed by position in `frame`; `rows` are selected
+    from the start (default: none).
+
+        diag = DesignDiagnostics(candidates_frame)
+        diag.add(design_rows)
+        diag.swap(out_row, in_row)      # one exchange step
+        diag.level_frequencies()
+    """
+
+    def __init__(self, frame, rows=None, attributes=None):
+        self.attributes = [col for col in (attributes or DIAGNOSTIC_ATTRIBUTES) if col in frame.columns]
+        self._build_slots(frame)
+        self._build_overlap(frame)
+        self._build_gaps(frame)
+
+        self.n_rows = 0
+        self.level_counts = np.zeros(self.n_slots, dtype=np.int64)
+        self.pair_counts = np.zeros((self.n_slots, self.n_slots), dtype=np.int64)
+        self.overlap_sums = np.zeros(self.overlap.shape[1])
+        self.no_overlap_rows = 0
+        self.gap_counts = np.zeros(len(self.gap_table), dtype=np.int64)
+        if rows is not None:
+            self.add(rows)
+
+    @classmethod
+    def level_tracker(cls, slots, n_slots, rows=None, base_counts=None):
+        """
+        Level counts only, on a precomputed slot table (e.g.
+        design_balance.flat_level_codes of the candidates): the state the
+        design optimizers keep up to date at every swap. `base_counts` are
+        the counts of rows selected elsewhere (e.g. the other baskets).
+        """
+        diag = cls.__new__(cls)
+        diag.slots = slots
+        diag.n_slots = n_slots
+        diag.n_rows = 0
+        diag.level_counts = np.zeros(n_slots) if base_counts is None else np.array(base_counts, dtype=float)
+        diag.pair_counts = diag.overlap = diag.gap_slots = None
+        if rows is not None:
+            diag.add(rows)
+        return diag
+
+    # --- Lookup tables (built once) ---
+
+    def _build_slots(self, frame):
+        """Slot of every (row, attribute): level code + offset, or the attribute's hidden slot."""
+        codes, labels, offset = [], [], 0
+        for col in self.attributes:
+            col_codes, uniques = pd.factorize(frame[col], sort=True)
+            codes.append(col_codes + offset)
+            labels += [(col, str(level)) for level in uniques]
+            offset += len(uniques)
+        slots = np.column_stack(codes) if codes else np.zeros((len(frame), 0), dtype=np.int64)
+        is_free = {nest: frame[f"{nest}_TopUp_Gap"].to_numpy() == 0
+                   for nest in OFFER_NESTS if f"{nest}_TopUp_Gap" in frame.columns}
+        self.slots = hide_free_slots(slots, self.attributes, is_free, offset)
+        self.slot_labels = labels + [(col, HIDDEN_LEVEL) for col in self.attributes]
+        self.n_levels = offset
+        self.n_slots = offset + len(self.attributes)
+
+    def _build_overlap(self, frame):
+        X, params = mnl_design_matrix(frame)
+        self.overlap, columns = overlap_per_attribute(X)
+        self.overlap_names = [params[k] for k in columns]
+
+    def _build_gaps(self, frame):
+        """Slot of every (row, nest) in the table of (basket, nest, gap) triples."""
+        nests = [nest for nest in OFFER_NESTS if f"{nest}_TopUp_Gap" in frame.columns]
+        contexts = frame['Context_Label'] if 'Context_Label' in frame.columns else pd.Series("", index=frame.index)
+        ctx_codes, ctx_labels = pd.factorize(contexts, sort=False)
+
+        slots, table = [], []
+        for nest in nests:
+            gap_codes, gap_values = pd.factorize(frame[f"{nest}_TopUp_Gap"], sort=True)
+            slots.append(len(table) + ctx_codes * len(gap_values) + gap_codes)
+            table += [(ctx, nest, gap) for ctx in ctx_labels for gap in gap_values]
+        self.gap_slots = np.column_stack(slots) if slots else np.zeros((len(frame), 0), dtype=np.int64)
+        self.gap_table = table
+
+    # --- Updates ---
+
+    def _update(self, rows, sign):
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        slots = self.slots[rows]
+        self.n_rows += sign * len(rows)
+        np.add.at(self.level_counts, slots.ravel(), sign)
+        if self.pair_counts is None:
+            return
+        np.add.at(self.pair_counts, (slots[:, :, None], slots[:, None, :]), sign)
+        self.overlap_sums += sign * self.overlap[rows].sum(axis=0)
+        self.no_overlap_rows += sign * int((self.overlap[rows].sum(axis=1) == 0).sum())
+        np.add.at(self.gap_counts, self.gap_slots[rows].ravel(), sign)
+
+    def add(self, rows):
+        """Adds rows (positions in the frame) to the selection."""
+        self._update(rows, 1)
+
+    def remove(self, rows):
+        """Removes rows (positions in the frame) from the selection."""
+        self._update(rows, -1)
+
+    def swap(self, out_row, in_row):
+        """One exchange step: `out_row` leaves the selection, `in_row` joins it."""
+        if self.pair_counts is None:
+            # Level tracker (the optimizers' inner loop): a row never has a slot twice, so plain indexing adds up
+            self.level_counts[self.slots[out_row]] -= 1
+            self.level_counts[self.slots[in_row]] += 1
+            return
+        self._update(out_row, -1)
+        self._update(in_row, 1)
+
+    # --- Reports ---
+
+    def level_frequencies(self):
+        """Count and share of every level among the rows that show the attribute."""
+        report = pd.DataFrame(self.slot_labels, columns=["Attribute", "Level"])
+        report["Count"] = self.level_counts
+        shown = report["Level"].ne(HIDDEN_LEVEL)
+        report = report[shown | report["Count"].gt(0)].copy()
+        totals = report["Count"].where(report["Level"].ne(HIDDEN_LEVEL), 0).groupby(report["Attribute"]).transform("sum")
+        report["Share"] = (report["Count"] / totals.where(totals > 0)).where(report["Level"].ne(HIDDEN_LEVEL))
+        return report.reset_index(drop=True)
+
+    def correlations(self):
+        """
+        Cramér's V between every pair of attributes (0 = independent,
+        1 = one determines the other), from the co-occurrence counts of the
+        shown levels.
+        """
+        starts = np.concatenate([[0], np.cumsum([len(self._levels_of(col)) for col in self.attributes])])
+        A = len(self.attributes)
+        V = np.eye(A)
+        for a in range(A):
+            for b in range(a + 1, A):
+                table = self.pair_counts[starts[a]:starts[a + 1], starts[b]:starts[b + 1]].astype(float)
+                V[a, b] = V[b, a] = _cramers_v(table)
+        return pd.DataFrame(V, index=self.attributes, columns=self.attributes)
+
+    def _levels_of(self, col):
+        return [label for attr, label in self.slot_labels[:self.n_levels] if attr == col]
+
+    def overlap_summary(self):
+        """Mean overlap per generic attribute and the share of choice sets without any overlap."""
+        n = max(self.n_rows, 1)
+        summary = {f"Overlap {name}": float(total / n) for name, total in zip(self.overlap_names, self.overlap_sums)}
+        summary["Overlap (mean)"] = float(self.overlap_sums.sum() / n / max(len(self.overlap_sums), 1))
+        summary["Scenarios without overlap"] = float(self.no_overlap_rows / n)
+        return summary
+
+    def gap_distribution(self):
+        """Scenarios per basket, nest and top-up gap (0 = FREE) in the selection."""
+        report = pd.DataFrame(self.gap_table, columns=["Context_Label", "Nest", "TopUp_Gap"])
+        report["Count"] = self.gap_counts
+        return report[report["Count"] > 0].reset_index(drop=True)
+
+
+def _cramers_v(table):
+    """Cramér's V of a contingency table; levels that never occur are dropped."""
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    n = table.sum()
+    k = min(table.shape) - 1
+    if n == 0 or k < 1:
+        return 0.0
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    return float(np.sqrt(chi2 / (n * k)))
+
+
+def design_diagnostics(final_design):
+    """Diagnostics of a whole generated design (every row selected)."""
+    return DesignDiagnostics(final_design, rows=np.arange(len(final_design)))
@@ -0,0 +1,159 @@
+"""
+Dominance check between the five delivery alternatives of every scenario.
+
+Alternative j dominates k when it is at least as good on every feature and
+strictly better on one: then nobody should pick k and the choice carries no
+trade-off information. Features (all "lower is better"):
+
+    Cost         what is paid without topping up (Final_Cost / Express price)
+    TopUp_Gap    how much must be added to get it free (Express: never -> inf)
+    Days         delivery time (Express next day, standard 2-4 days)
+    Not_Green    1 without the fossil-free badge
+    Distance_km  trip to the pick-up point (Home: 0)
+
+Green and distance are only used when their columns exist. j near-dominates
+k when it is at least as good up to a tolerance (e.g. 10 SEK, 0.5 km) on
+every feature and strictly better on one.
+
+Everything is evaluated for all rows and all 5 x 5 pairs at once, in chunks
+of rows to bound memory. In the constraint language the flags are available
+as Is_Dominated and Is_Near_Dominated (e.g. the rule "not Is_Dominated").
+"""
+import numpy as np
+import pandas as pd
+
+from design_engine import compute_offers
+from design_search import ALTERNATIVES, distance_to_km
+
+# Delivery time shown in the survey ("Next Day" / "2-4 Days", midpoint)
+DELIVERY_DAYS = {"Home_Standard": 3, "Home_Express": 1, "Locker_Standard": 3,
+                 "Locker_Express": 1, "Shop_Collect": 3}
+
+# Differences up to these amounts count as "as good" for near-dominance
+NEAR_TOLERANCE = {"Cost": 10, "TopUp_Gap": 0, "Days": 0, "Not_Green": 0, "Distance_km": 0.5}
+
+# Columns the check reads; the green and distance columns are optional
+DOMINANCE_COLUMNS = {
+    "Locker_Price", "Locker_Threshold", "Locker_Exp_Price",
+    "Home_Price", "Home_Threshold", "Home_Exp_Price",
+    "Shop_Price", "Shop_Threshold",
+}
+OPTIONAL_COLUMNS = {"Home_Is_Green", "Locker_Is_Green", "Shop_Is_Green", "Locker_Distance", "Shop_Distance"}
+
+
+def _as_flag(values):
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    return np.char.upper(values.astype(str)) == "TRUE"
+
+
+def _as_km(values):
+    codes, uniques = pd.factorize(np.asarray(values))
+    return np.array([distance_to_km(u) for u in uniques], dtype=float)[codes]
+
+
+def alternative_features(columns, cart_value):
+    """
+    (n_rows, 5, n_features) array of the features of every alternative, in
+    ALTERNATIVES order, plus the names of the features that were used.
+    `columns` is anything indexable by column name (a DataFrame, a dict of arrays).
+    """
+    offers = {nest: compute_offers(columns[f"{nest}_Price"], columns[f"{nest}_Threshold"], cart_value)
+              for nest in ("Home", "Locker", "Shop")}
+    n = len(offers["Home"][0])
+    zeros, never = np.zeros(n), np.full(n, np.inf)
+
+    cost = [offers["Home"][0], columns["Home_Exp_Price"], offers["Locker"][0],
+            columns["Locker_Exp_Price"], offers["Shop"][0]]
+    gap = [offers["Home"][1], never, offers["Locker"][1], never, offers["Shop"][1]]
+    days = [np.full(n, DELIVERY_DAYS[alt]) for alt in ALTERNATIVES]
+    per_feature = {"Cost": cost, "TopUp_Gap": gap, "Days": days}
+
+    if all(f"{nest}_Is_Green" in columns for nest in ("Home", "Locker", "Shop")):
+        # The badge is shown on the standard options only
+        not_green = {nest: 1.0 - _as_flag(columns[f"{nest}_Is_Green"]) for nest in ("Home", "Locker", "Shop")}
+        per_feature["Not_Green"] = [not_green["Home"], np.ones(n), not_green["Locker"], np.ones(n), not_green["Shop"]]
+
+    if "Locker_Distance" in columns and "Shop_Distance" in columns:
+        locker_km, shop_km = _as_km(columns["Locker_Distance"]), _as_km(columns["Shop_Distance"])
+        per_feature["Distance_km"] = [zeros, zeros, locker_km, locker_km, shop_km]
+
+    F = np.stack([np.stack([np.asarray(v, dtype=float) for v in per_alt], axis=1)
+                  for per_alt in per_feature.values()], axis=2)
+    return F, list(per_feature)
+
+
+def dominance_pairs(F, tolerance=None):
+    """
+    (n_rows, 5, 5) boolean: [s, j, k] is True when j (near-)dominates k in row s.
+    `tolerance` is a vector over the features (None: strict dominance).
+    """
+    tol = np.zeros(F.shape[2]) if tolerance is None else np.asarray(tolerance, dtype=float)
+    n_rows, J, n_features = F.shape
+    as_good = np.ones((n_rows, J, J), dtype=bool)
+    better = np.zeros((n_rows, J, J), dtype=bool)
+    # One (rows, 5, 5) comparison per feature (faster than reducing over a short last axis)
+    for f in range(n_features):
+        a, b = F[:, :, f, None], F[:, None, :, f]
+        as_good &= a <= b + tol[f]
+        better |= a < b
+    pairs = as_good & better
+    pairs[:, np.arange(F.shape[1]), np.arange(F.shape[1])] = False
+    return pairs
+
+
+def _tolerance_vector(feature_names, near):
+    if not near:
+        return None
+    tolerance = NEAR_TOLERANCE if near is True else near
+    return [tolerance.get(name, 0) for name in feature_names]
+
+
+def dominated_mask(columns, cart_value, near=False, chunk_rows=100_000):
+    """
+    True for every row in which some alternative is (near-)dominated.
+    near: False, True (NEAR_TOLERANCE) or a dict of tolerances per feature.
+    """
+    F, names = alternative_features(columns, cart_value)
+    tolerance = _tolerance_vector(names, near)
+    flagged = np.zeros(len(F), dtype=bool)
+    for start in range(0, len(F), chunk_rows):
+        flagged[start:start + chunk_rows] = dominance_pairs(F[start:start + chunk_rows], tolerance).any(axis=(1, 2))
+    return flagged
+
+
+def dominance_counts(columns, cart_value, near=False, chunk_rows=100_000):
+    """
+    (5, 5) array of the rows in which j (near-)dominates k, and the number
+    of rows flagged by any rule. Counts of row chunks simply add up.
+    """
+    F, names = alternative_features(columns, cart_value)
+    tolerance = _tolerance_vector(names, near)
+    J = len(ALTERNATIVES)
+    per_pair = np.zeros((J, J), dtype=np.int64)
+    total = 0
+    for start in range(0, len(F), chunk_rows):
+        pairs = dominance_pairs(F[start:start + chunk_rows], tolerance)
+        per_pair += pairs.sum(axis=0)
+        total += int(pairs.any(axis=(1, 2)).sum())
+    return per_pair, total
+
+
+def dominance_table(per_pair, total, near=False):
+    """Report of dominance_counts(): rows per rule, largest first, plus the "Any rule" total."""
+    J = len(ALTERNATIVES)
+    verb = "near-dominates" if near else "dominates"
+    rows = [{"Rule": f"{ALTERNATIVES[j]} {verb} {ALTERNATIVES[k]}", "Rows": int(per_pair[j, k])}
+            for j in range(J) for k in range(J) if per_pair[j, k]]
+    report = pd.DataFrame(rows, columns=["Rule", "Rows"]).sort_values("Rows", ascending=False, ignore_index=True)
+    report.loc[len(report)] = ["Any rule", total]
+    return report
+
+
+def dominance_report(columns, cart_value, near=False, chunk_rows=100_000):
+    """
+    Rows flagged by every rule "j dominates k" (a row can break several
+    rules), plus the total of rows flagged by any rule.
+    """
+    return dominance_table(*dominance_counts(columns, cart_value, near, chunk_rows), near=near)
@@ -0,0 +1,250 @@
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+# --- 1. OFFER CONFIGURATION ---
+
+# Alternatives that carry a Top-Up offer (price + free threshold)
+OFFER_NESTS = ["Locker", "Home", "Shop"]
+
+# Alternatives that carry a flat Express price
+EXPRESS_NESTS = ["Locker", "Home"]
+
+
+# --- 2. VECTORIZED OFFER ENGINE ---
+
+def compute_offers(price, threshold, cart_value):
+    """
+    Vectorized version of get_offer().
+    Returns (final_cost, topup_gap) as integer arrays.
+    """
+    price = np.asarray(price, dtype=np.int64)
+    threshold = np.asarray(threshold, dtype=np.int64)
+
+    is_free = cart_value >= threshold
+    final_cost = np.where(is_free, 0, price)
+    topup_gap = np.where(is_free, 0, threshold - cart_value)
+    return final_cost, topup_gap
+
+
+def format_offer_display(final_cost, topup_gap):
+    """
+    Builds "Pay 39 or Add 59" / "FREE" strings.
+    Only the few unique (cost, gap) pairs are formatted, then broadcast back.
+    """
+    final_cost = np.asarray(final_cost, dtype=np.int64)
+    topup_gap = np.asarray(topup_gap, dtype=np.int64)
+    if final_cost.size == 0:
+        return np.empty(0, dtype=object)
+
+    # A gap of 0 only happens when the cart already reaches the threshold
+    pair_key = (final_cost << 32) | topup_gap
+    unique_keys, inverse = np.unique(pair_key, return_inverse=True)
+
+    labels = np.empty(len(unique_keys), dtype=object)
+    for i, key in enumerate(unique_keys):
+        cost, gap = int(key >> 32), int(key & 0xFFFFFFFF)
+        labels[i] = "FREE" if gap == 0 else f"Pay {cost} or Add {gap}"
+    return labels[inverse.ravel()]
+
+
+def format_express_display(express_price):
+    """Builds "Pay 49" strings for the Express alternatives."""
+    express_price = np.asarray(express_price, dtype=np.int64)
+    if express_price.size == 0:
+        return np.empty(0, dtype=object)
+
+    unique_prices, inverse = np.unique(express_price, return_inverse=True)
+    labels = np.array([f"Pay {p}" for p in unique_prices], dtype=object)
+    return labels[inverse.ravel()]
+
+
+def logic_filter_mask(locker_gap, home_gap, shop_gap):
+    """
+    Returns True for every row that passes the logic filters.
+    """
+    # Filter 1: Eliminate Double Free (Home vs Locker)
+    mask_double_free = (home_gap == 0) & (locker_gap == 0)
+
+    # Filter 2: Enforce Hierarchy (Locker vs Shop)
+    # If Locker is Free, Shop MUST be Free.
+    mask_illogical_shop = (locker_gap == 0) & (shop_gap > 0)
+
+    # Filter 3: Enforce Hierarchy (Home vs Locker)
+    # If Home is Free, Locker MUST be Free.
+    mask_illogical_locker = (home_gap == 0) & (locker_gap > 0)
+
+    mask_bad = mask_double_free | mask_illogical_shop | mask_illogical_locker
+    return ~mask_bad
+
+
+def calculate_scenario_logic(df, cart_value, constraints=None):
+    """
+    Applies Top-Up Logic AND Filtering (vectorized).
+    Same columns as the original row-wise version, but the display strings
+    are only built for the rows that survive the filters.
+    `constraints` (a design_constraints.ConstraintSet) replaces the three
+    built-in logic filters.
+    """
+    # 1. Calculate Costs & Gaps on the whole frame (pure NumPy)
+    offers = {}
+    for nest in OFFER_NESTS:
+        offers[nest] = compute_offers(
+            df[f"{nest}_Price"].to_numpy(), df[f"{nest}_Threshold"].to_numpy(), cart_value
+        )
+
+    # 2. Logic Filters
+    if constraints is None:
+        keep = logic_filter_mask(offers["Locker"][1], offers["Home"][1], offers["Shop"][1])
+    else:
+        keep = constraints.mask(df, cart_value)
+    res = df[keep].copy()
+
+    # 3. Attach numbers + display strings for the surviving rows only
+    for nest in OFFER_NESTS:
+        final_cost, topup_gap = offers[nest][0][keep], offers[nest][1][keep]
+        res[f"{nest}_Final_Cost"] = final_cost
+        res[f"{nest}_TopUp_Gap"] = topup_gap
+        res[f"{nest}_Display"] = format_offer_display(final_cost, topup_gap)
+
+    # Express Displays
+    for nest in EXPRESS_NESTS:
+        res[f"{nest}_Exp_Display"] = format_express_display(res[f"{nest}_Exp_Price"].to_numpy())
+
+    return res
+
+
+# --- 3. FACTORIAL GENERATION ---
+
+def generate_full_factorial(levels):
+    """
+    Generates all possible combinations of attributes.
+    `levels` maps column name -> list of selected levels (in product order).
+    """
+    combinations = list(itertools.product(*levels.values()))
+    return pd.DataFrame(combinations, columns=list(levels))
+
+
+def iter_factorial_chunks(levels, chunk_size=100_000):
+    """
+    Yields the Cartesian product in DataFrames of at most `chunk_size` rows.
+    Each chunk keeps its global row number as index, so results match the
+    in-memory full factorial.
+    """
+    product = itertools.product(*levels.values())
+    offset = 0
+    while True:
+        block = list(itertools.islice(product, chunk_size))
+        if not block:
+            return
+        index = pd.RangeIndex(offset, offset + len(block))
+        yield pd.DataFrame(block, columns=list(levels), index=index)
+        offset += len(block)
+
+
+# --- 4. VISUAL DE-DUPLICATION ---
+#
+# Two rows are the same "Unique Visual Scenario" when every display column
+# shows the same thing. Instead of comparing the strings, every display
+# column becomes a small integer code taken from the level lists:
+#   * <Nest>_Display     -> 0 for "FREE", else 1 + price_code * n_thresholds + threshold_code
+#                           ("Pay X or Add Y" is unique per (price, threshold) pair)
+#   * <Nest>_Exp_Display -> code of the Express price
+#   * anything else      -> code of its own level (green flags, distances, ...)
+# and the codes are packed into one uint64 per row (mixed radix, no hashing,
+# so two different scenarios never share a key).
+
+def visual_key_radices(display_cols, levels):
+    """Number of distinct codes of every display column."""
+    radices = []
+    for col in display_cols:
+        nest = col.split("_", 1)[0]
+        if col == f"{nest}_Display" and nest in OFFER_NESTS:
+            radices.append(1 + len(levels[f"{nest}_Price"]) * len(levels[f"{nest}_Threshold"]))
+        elif col == f"{nest}_Exp_Display" and nest in EXPRESS_NESTS:
+            radices.append(len(levels[f"{nest}_Exp_Price"]))
+        else:
+            radices.append(len(levels[col]))
+    return radices
+
+
+def _level_codes(values, options):
+    """Position of every value in `options`. Only the few distinct values are looked up."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    lookup = pd.Index(list(options)).get_indexer(uniques)
+    if (lookup < 0).any():
+        raise ValueError("Value not found in the attribute levels.")
+    return lookup[codes]
+
+
+def combine_codes(codes, radices):
+    """Packs per-column codes (each below its radix) into one uint64 key per row."""
+    if math.prod(int(r) for r in radices) > 2 ** 64:
+        raise ValueError("Too many display combinations for a 64-bit key.")
+    key = None
+    for column_codes, radix in zip(codes, radices):
+        column_codes = np.asarray(column_codes).astype(np.uint64)
+        key = column_codes if key is None else key * np.uint64(radix) + column_codes
+    return key
+
+
+def visual_keys(df, display_cols, levels):
+    """
+    uint64 key per row identifying its "Unique Visual Scenario".
+    `df` is the output of calculate_scenario_logic(); `levels` the level lists it was built from.
+    """
+    codes = []
+    for col in display_cols:
+        nest = col.split("_", 1)[0]
+        if col == f"{nest}_Display" and nest in OFFER_NESTS:
+            n_thresholds = len(levels[f"{nest}_Threshold"])
+            price_code = _level_codes(df[f"{nest}_Price"], levels[f"{nest}_Price"])
+            threshold_code = _level_codes(df[f"{nest}_Threshold"], levels[f"{nest}_Threshold"])
+            is_free = df[f"{nest}_TopUp_Gap"].to_numpy() == 0
+            codes.append(np.where(is_free, 0, 1 + price_code * n_thresholds + threshold_code))
+        elif col == f"{nest}_Exp_Display" and nest in EXPRESS_NESTS:
+            codes.append(_level_codes(df[f"{nest}_Exp_Price"], levels[f"{nest}_Exp_Price"]))
+        else:
+            codes.append(_level_codes(df[col], levels[col]))
+    return combine_codes(codes, visual_key_radices(display_cols, levels))
+
+
+def first_occurrence(keys):
+    """True for the first row of every key, in row order (same rows as drop_duplicates)."""
+    keys = np.asarray(keys)
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[np.unique(keys, return_index=True)[1]] = True
+    return keep
+
+
+# --- 5. STREAMING GENERATION ---
+
+def stream_unique_scenarios(levels, ctx, display_cols, chunk_size=100_000, constraints=None):
+    """
+    Streaming version of: full factorial -> calculate_scenario_logic -> drop_duplicates.
+    Filters and visual de-duplication run per chunk, so only one chunk plus
+    the unique scenarios found so far are held in memory.
+    """
+    seen_keys = np.empty(0, dtype=np.uint64)
+    unique_chunks = []
+    empty_result = pd.DataFrame()
+
+    for chunk in iter_factorial_chunks(levels, chunk_size):
+        chunk['Context_Cart_Value'] = ctx['val']
+        chunk['Context_Label'] = ctx['label']
+        calculated = calculate_scenario_logic(chunk, ctx['val'], constraints)
+        empty_result = calculated.iloc[0:0]
+
+        keys = visual_keys(calculated, display_cols, levels)
+
+        # Keep the first occurrence inside the chunk and drop anything seen in earlier chunks
+        is_new = first_occurrence(keys) & ~np.isin(keys, seen_keys)
+        if is_new.any():
+            unique_chunks.append(calculated[is_new])
+            seen_keys = np.union1d(seen_keys, keys[is_new])
+
+    if not unique_chunks:
+        return empty_result
+    return pd.concat(unique_chunks)
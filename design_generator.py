@@ -0,0 +1,313 @@
+"""
+Headless design generator: the pipeline of choice_design_sus.py without Streamlit.
+
+    python -m design_generator spec.json [more_specs.json ...] --out designs/
+
+Every spec file is a JSON object; missing keys fall back to the defaults below.
+
+    {
+      "levels":   {"Locker_Price": [29, 39], ...},
+      "contexts": [{"val": 240, "label": "Small Basket (240kr)", "n": 8}, ...],
+      "seed": 42,
+      "mode": "full" | "streaming" | "implicit",
+      "constraints": "rule text (see design_constraints)",   or  "constraints_file": "rules.txt",
+      "design_search": false,
+      "candidate_pool": 5000,
+      "search_starts": 1,                       (> 1: multi-start search, see design_optimizer)
+      "search_method": "exchange" | "annealing",
+      "scenarios_per_block": 16,                (larger designs get a balanced Block column)
+      "chunk_size": 100000
+    }
+
+For every spec, <out>/<spec name>.csv, .parquet and .json are written in one
+pass over the design. The CSV is the same file as the app's download
+button, and the JSON is a compact survey pack (column list + one array per
+scenario). Parquet needs pyarrow and is skipped when it is not installed.
+"""
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from design_blocks import assign_blocks
+from design_codes import CodedDesign, rejection_sample, unique_visuals_per_context
+from design_constraints import DEFAULT_CONSTRAINTS, ConstraintSet, load_constraints
+from design_engine import stream_unique_scenarios
+from design_optimizer import multistart_search
+from design_search import optimal_scenarios
+from design_space import DesignSpace
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# --- 1. DEFAULTS (same as the sidebar defaults of choice_design_sus.py) ---
+
+DEFAULT_LEVELS = {
+    "Locker_Price": [29, 39], "Locker_Threshold": [199, 299],
+    "Locker_Exp_Price": [49, 59], "Locker_Is_Green": [True, False], "Locker_Distance": ["<1 km", "1-2 km"],
+    "Home_Price": [69, 79], "Home_Threshold": [799, 899],
+    "Home_Exp_Price": [99, 129], "Home_Is_Green": [True, False],
+    "Shop_Price": [19, 29], "Shop_Threshold": [149, 249], "Shop_Is_Green": [True, False],
+    "Shop_Distance": ["2-4 km", "4-6 km"],
+}
+
+# We use 750 SEK for Big Basket to avoid the "Home Double Free" issue.
+DEFAULT_CONTEXTS = [
+    {"val": 240, "label": "Small Basket (240kr)", "n": 8},
+    {"val": 750, "label": "Big Basket (750kr)", "n": 8},
+]
+
+# What constitutes a "Unique Visual Scenario"
+DISPLAY_COLS = [
+    'Shop_Display', 'Shop_Is_Green', 'Shop_Distance',
+    'Locker_Display', 'Locker_Exp_Display', 'Locker_Is_Green', 'Locker_Distance',
+    'Home_Display', 'Home_Exp_Display', 'Home_Is_Green'
+]
+
+# Columns the survey apps read, in the order of the JSON survey pack
+SURVEY_COLS = [
+    'Scenario_ID', 'Block', 'Context_Label', 'Context_Cart_Value',
+    'Home_Display', 'Home_Exp_Display', 'Home_Is_Green',
+    'Locker_Display', 'Locker_Exp_Display', 'Locker_Is_Green', 'Locker_Distance',
+    'Shop_Display', 'Shop_Is_Green', 'Shop_Distance',
+]
+
+GENERATION_MODES = ("full", "streaming", "implicit")
+
+
+# --- 2. THE PIPELINE ---
+
+def build_final_design(levels, contexts, display_cols=DISPLAY_COLS, seed=42, constraints=None, mode="full",
+                       chunk_size=100_000, design_search=False, candidate_pool=5_000,
+                       search_starts=1, search_method="exchange", workers=None, scenarios_per_block=None,
+                       candidates=None):
+    """
+    Runs the whole pipeline (logic, filters, de-duplication, sampling/search).
+    Returns (final_design, notes, traces): notes are warnings for the user,
+    traces the convergence trace per basket label of the multi-start search
+    (design_search with search_starts > 1).
+
+    When the design has more than `scenarios_per_block` rows, it is split
+    into balanced respondent blocks (a Block column next to Scenario_ID).
+
+    `candidates` (full mode): an IncrementalCandidates kept between calls, so
+    a level change only filters the rows that involve the new levels.
+    """
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation mode '{mode}' (expected one of {', '.join(GENERATION_MODES)}).")
+    notes = []
+
+    # 1. The Design Space (never materialized as a whole: rows are level codes or drawn by index)
+    design_space = DesignSpace(levels)
+
+    final_dfs = []
+
+    # Information matrix and level counts of the baskets already picked (design search only)
+    design_info = None
+    design_counts = None
+    traces = {}
+
+    if mode == "full":
+        # A-C for all baskets at once: baskets that reach the same free thresholds
+        # share the filtered, de-duplicated candidates (as small level codes)
+        if candidates is not None:
+            candidates.update(levels, constraints)
+            unique_per_context = candidates.unique_visuals_per_context(contexts, display_cols)
+        else:
+            unique_per_context = unique_visuals_per_context(design_space, contexts, display_cols, constraints)
+
+    # We loop through the contexts (Small, Big & extra baskets) to apply the same cleaning logic
+    for i, ctx in enumerate(contexts):
+        if mode == "implicit":
+            # A-C in one pass: draw, filter and de-duplicate until enough unique scenarios are found
+            n_draw = max(candidate_pool, ctx['n']) if design_search else ctx['n']
+            unique_visuals, sampling = rejection_sample(design_space, ctx, display_cols, n_draw, seed,
+                                                        constraints=constraints)
+            if sampling["method"] == "enumeration":
+                notes.append(f"Note: Only {sampling['acceptance_rate']:.1%} of random draws pass the filters "
+                             f"for {ctx['label']}, so the filtered space was enumerated instead.")
+            if "warning" in sampling:
+                notes.append(sampling["warning"])
+        elif mode == "streaming":
+            # A-C in one pass: logic, filters and de-duplication run per chunk
+            unique_visuals = stream_unique_scenarios(levels, ctx, display_cols, chunk_size=chunk_size,
+                                                     constraints=constraints)
+        else:
+            unique_visuals = unique_per_context[i]
+
+        # D. Sample from the UNIQUE list
+        if len(unique_visuals) < ctx['n']:
+            notes.append(f"Note: Only {len(unique_visuals)} unique scenarios exist for {ctx['label']}. Returning all of them.")
+            sampled_df = unique_visuals
+        elif design_search and search_starts > 1:
+            # Best of many exchange / annealing starts on D-error, level balance and overlap
+            if not isinstance(unique_visuals, CodedDesign):
+                unique_visuals = CodedDesign(design_space, unique_visuals.index, ctx, constraints)
+            result = multistart_search(unique_visuals, ctx['n'], starts=search_starts, method=search_method,
+                                       seed=seed, M0=design_info, base_counts=design_counts, workers=workers)
+            sampled_df = result["rows"]
+            design_info = result["M"] if design_info is None else design_info + result["M"]
+            design_counts = result["counts"]
+            traces[ctx['label']] = result["trace"]
+        elif design_search:
+            # Optimize this basket given the information of the baskets picked before it
+            if isinstance(unique_visuals, CodedDesign):
+                unique_visuals = unique_visuals.to_frame()
+            sampled_df, _, ctx_info = optimal_scenarios(unique_visuals, ctx['n'], seed=seed, M0=design_info)
+            design_info = ctx_info if design_info is None else design_info + ctx_info
+        elif mode == "implicit":
+            # Already a random draw of exactly n scenarios
+            sampled_df = unique_visuals
+        else:
+            sampled_df = unique_visuals.sample(n=ctx['n'], random_state=seed)
+
+        # Display strings are only built for the scenarios that end up in the design
+        if isinstance(sampled_df, CodedDesign):
+            sampled_df = sampled_df.to_frame()
+
+        final_dfs.append(sampled_df)
+
+    # Combine the baskets into one final design
+    final_design = pd.concat(final_dfs).reset_index(drop=True)
+    final_design.index.name = "Scenario_ID"
+    final_design.index += 1 # Start ID at 1 for readability
+
+    # E. Split into respondent blocks when one respondent cannot answer everything
+    if scenarios_per_block and len(final_design) > scenarios_per_block:
+        n_blocks = -(-len(final_design) // scenarios_per_block)
+        final_design.insert(0, "Block", assign_blocks(final_design, n_blocks, seed=seed))
+    return final_design, notes, traces
+
+
+# --- 3. SPEC FILES ---
+
+def load_spec(path):
+    """Reads a JSON spec and fills in the defaults. Returns the keyword arguments of build_final_design()."""
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+
+    levels = {**DEFAULT_LEVELS, **spec.get("levels", {})}
+    empty = [col for col, opts in levels.items() if len(opts) == 0]
+    if empty:
+        raise ValueError(f"No levels selected for: {', '.join(empty)}")
+
+    constraints_text = spec.get("constraints", DEFAULT_CONSTRAINTS)
+    if "constraints_file" in spec:
+        # Relative paths are resolved next to the spec file
+        rules_path = os.path.join(os.path.dirname(os.path.abspath(path)), spec["constraints_file"])
+        constraints = load_constraints(rules_path, levels)
+    else:
+        constraints = ConstraintSet(constraints_text, levels)
+
+    return {
+        "levels": levels,
+        "contexts": spec.get("contexts", DEFAULT_CONTEXTS),
+        "display_cols": spec.get("display_cols", DISPLAY_COLS),
+        "seed": int(spec.get("seed", 42)),
+        "constraints": constraints,
+        "mode": spec.get("mode", "full"),
+        "chunk_size": int(spec.get("chunk_size", 100_000)),
+        "design_search": bool(spec.get("design_search", False)),
+        "candidate_pool": int(spec.get("candidate_pool", 5_000)),
+        "search_starts": int(spec.get("search_starts", 1)),
+        "search_method": spec.get("search_method", "exchange"),
+        "scenarios_per_block": spec.get("scenarios_per_block"),
+    }
+
+
+# --- 4. EXPORT ---
+
+def _json_value(value):
+    """numpy scalars -> plain Python values for json.dumps."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def export_design(final_design, out_prefix, formats=("csv", "parquet", "json"), chunk_rows=10_000):
+    """
+    Writes <out_prefix>.csv / .parquet / .json in one pass over the design:
+    every chunk of rows goes to all open writers before the next one is read.
+    Returns the paths that were written.
+    """
+    formats = set(formats)
+    if "parquet" in formats and pq is None:
+        print("pyarrow is not installed: skipping the Parquet export.", file=sys.stderr)
+        formats.discard("parquet")
+
+    paths = {fmt: f"{out_prefix}.{fmt}" for fmt in ("csv", "parquet", "json") if fmt in formats}
+    survey_cols = [col for col in SURVEY_COLS if col == "Scenario_ID" or col in final_design.columns]
+
+    csv_file = open(paths["csv"], "w", encoding="utf-8", newline="") if "csv" in paths else None
+    json_file = open(paths["json"], "w", encoding="utf-8") if "json" in paths else None
+    parquet_writer = None
+    try:
+        if json_file:
+            json_file.write('{"format":"shipping-topup-survey-pack","version":1,"columns":')
+            json_file.write(json.dumps(survey_cols, separators=(",", ":")))
+            json_file.write(',"scenarios":[')
+
+        for start in range(0, max(len(final_design), 1), chunk_rows):
+            chunk = final_design.iloc[start:start + chunk_rows]
+
+            if csv_file:
+                chunk.to_csv(csv_file, header=(start == 0))
+
+            if "parquet" in paths:
+                table = pa.Table.from_pandas(chunk, preserve_index=True)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(paths["parquet"], table.schema)
+                parquet_writer.write_table(table)
+
+            if json_file:
+                records = chunk.reset_index()[survey_cols].itertuples(index=False, name=None)
+                for i, record in enumerate(records):
+                    if start + i:
+                        json_file.write(",")
+                    json_file.write(json.dumps(record, separators=(",", ":"), default=_json_value))
+
+        if json_file:
+            json_file.write("]}\n")
+    finally:
+        for f in (csv_file, json_file):
+            if f:
+                f.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return list(paths.values())
+
+
+# --- 5. COMMAND LINE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Top-Up choice designs without the Streamlit UI.")
+    parser.add_argument("specs", nargs="+", help="JSON spec file(s); one design is generated per file")
+    parser.add_argument("--out", default=".", help="output directory (default: current directory)")
+    parser.add_argument("--formats", nargs="+", default=["csv", "parquet", "json"],
+                        choices=["csv", "parquet", "json"], help="files to write (default: all three)")
+    parser.add_argument("--seed", type=int, default=None, help="override the seed of every spec")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    for spec_path in args.specs:
+        try:
+            kwargs = load_spec(spec_path)
+        except (OSError, ValueError) as e:  # ConstraintError is a ValueError
+            parser.exit(2, f"{spec_path}: {e}\n")
+        if args.seed is not None:
+            kwargs["seed"] = args.seed
+
+        final_design, notes, _ = build_final_design(**kwargs)
+        for note in notes:
+            print(f"{spec_path}: {note}", file=sys.stderr)
+
+        name = os.path.splitext(os.path.basename(spec_path))[0]
+        written = export_design(final_design, os.path.join(args.out, name), args.formats)
+        print(f"{spec_path}: {len(final_design)} scenarios -> {', '.join(written)}")
+
+
+if __name__ == "__main__":
+    main()
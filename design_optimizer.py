@@ -0,0 +1,239 @@
+"""
+Multi-start design optimizer: many independent searches, best one wins.
+
+Every start is a random design improved either by coordinate exchange
+(swap each row for the best candidate, pass after pass) or by simulated
+annealing (random swaps, worse designs accepted with a falling
+probability). Starts run in parallel on a process pool and are scored on
+
+    score = D-error * (1 + balance_weight * balance + overlap_weight * overlap)
+
+where balance is the level-balance objective of design_balance per row
+and overlap the share of alternatives that show the same value of an
+attribute within a choice set.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from design_search import information_factors, mnl_design_matrix, overlap_per_scenario
+from design_balance import balance_objective, balance_targets, flat_level_codes
+from design_diagnostics import DesignDiagnostics
+
+SEARCH_METHODS = ("exchange", "annealing")
+
+
+# --- 1. METRICS ---
+
+class _Problem:
+    """Everything a worker needs to score designs; sent to each process once."""
+
+    def __init__(self, U, flat, radices, overlap, n, M0, base_counts, weights, ridge=1e-6):
+        self.U = U
+        self.flat = flat
+        self.radices = radices
+        self.overlap = overlap
+        self.n = n
+        self.K = U.shape[1]
+        self.base = (np.zeros((self.K, self.K)) if M0 is None else np.asarray(M0, dtype=float)) \
+            + ridge * np.eye(self.K)
+        self.n_slots = int(radices.sum()) + len(radices)
+        self.base_counts = base_counts
+        self.balance_weight, self.overlap_weight = weights
+
+    def levels(self, design):
+        """Running level counts of a design (candidate row numbers), on top of the other baskets' counts."""
+        return DesignDiagnostics.level_tracker(self.flat, self.n_slots, design, self.base_counts)
+
+    def metrics(self, design):
+        """(score, D-error, balance, overlap) of a design (candidate row numbers)."""
+        M = self.base + np.einsum('skj,slj->kl', self.U[design], self.U[design])
+        return self._score(np.linalg.slogdet(M)[1], self.levels(design).level_counts, self.overlap[design].sum())
+
+    def _score(self, logdet, counts, overlap_sum):
+        d_error = float(np.exp(-logdet / self.K))
+        n_rows = max(counts[:self.radices[0]].sum(), 1)
+        balance = balance_objective(counts, self.radices) / n_rows
+        overlap = float(overlap_sum / self.n)
+        score = d_error * (1 + self.balance_weight * balance + self.overlap_weight * overlap)
+        return float(score), d_error, float(balance), overlap
+
+
+# --- 2. ONE START ---
+
+def _exchange(problem, rng, max_passes=20, tol=1e-9):
+    """Coordinate exchange on the combined score. Returns (design, trace of the score per pass)."""
+    U, flat, n = problem.U, problem.flat, problem.n
+    J = U.shape[2]
+    eye_J = np.eye(J)
+    design = rng.choice(len(U), size=n, replace=False)
+    in_design = np.zeros(len(U), dtype=bool)
+    in_design[design] = True
+
+    M = problem.base + np.einsum('skj,slj->kl', U[design], U[design])
+    levels = problem.levels(design)
+    counts = levels.level_counts  # updated in place by levels.swap()
+    overlap_sum = problem.overlap[design].sum()
+    current = problem._score(np.linalg.slogdet(M)[1], counts, overlap_sum)[0]
+    trace = [current]
+
+    for _ in range(max_passes):
+        improved = False
+        for pos in range(n):
+            i = design[pos]
+            # Take row i out, then score every candidate in its place
+            M_minus = M - U[i] @ U[i].T
+            A = np.linalg.inv(M_minus)
+            logdet_minus = np.linalg.slogdet(M_minus)[1]
+            W = np.transpose(U, (0, 2, 1)) @ (A @ U)
+            W += eye_J
+            sign, gain = np.linalg.slogdet(W)
+            d_error = np.exp(-(logdet_minus + gain) / problem.K)
+
+            # Balance: O(1) change of the squared deviations per attribute
+            d = counts - balance_targets(counts, problem.radices)
+            change = 2 * (d[flat] - d[flat[i]]) + 2
+            change[flat == flat[i]] = 0
+            n_rows = max(counts[:problem.radices[0]].sum(), 1)
+            balance = (balance_objective(counts, problem.radices) + change.sum(axis=1)) / n_rows
+            overlap = (overlap_sum - problem.overlap[i] + problem.overlap) / n
+
+            score = d_error * (1 + problem.balance_weight * balance + problem.overlap_weight * overlap)
+            score[(sign <= 0) | in_design] = np.inf
+
+            best = int(np.argmin(score))
+            if score[best] >= current - tol:
+                continue
+
+            # Swap, then recompute the exact score (the balance change above is a first-order estimate)
+            levels.swap(i, best)
+            trial_M = M_minus + U[best] @ U[best].T
+            trial_overlap = overlap_sum - problem.overlap[i] + problem.overlap[best]
+            trial_score = problem._score(np.linalg.slogdet(trial_M)[1], counts, trial_overlap)[0]
+            if trial_score >= current - tol:
+                levels.swap(best, i)
+                continue
+
+            M, overlap_sum, current = trial_M, trial_overlap, trial_score
+            in_design[i] = False
+            in_design[best] = True
+            design[pos] = best
+            improved = True
+
+        trace.append(current)
+        if not improved:
+            break
+    return design, trace
+
+
+def _annealing(problem, rng, n_iter=5_000, t_start=0.05, t_end=1e-4, trace_every=100):
+    """
+    Simulated annealing on log(score): a random row is swapped for a random
+    candidate and kept with probability min(1, exp(-delta / T)).
+    Returns (best design, trace of the best score every `trace_every` steps).
+    """
+    U, n = problem.U, problem.n
+    design = rng.choice(len(U), size=n, replace=False)
+    in_design = np.zeros(len(U), dtype=bool)
+    in_design[design] = True
+
+    M = problem.base + np.einsum('skj,slj->kl', U[design], U[design])
+    levels = problem.levels(design)
+    overlap_sum = problem.overlap[design].sum()
+    current = problem._score(np.linalg.slogdet(M)[1], levels.level_counts, overlap_sum)[0]
+    best_design, best = design.copy(), current
+    trace = [best]
+
+    cooling = (t_end / t_start) ** (1 / max(n_iter - 1, 1))
+    temperature = t_start
+    for step in range(1, n_iter + 1):
+        pos = int(rng.integers(n))
+        c = int(rng.integers(len(U)))
+        i = design[pos]
+
+        trial_M = M - U[i] @ U[i].T + U[c] @ U[c].T
+        sign, logdet = np.linalg.slogdet(trial_M)
+        if sign > 0 and not in_design[c]:
+            levels.swap(i, c)
+            trial_overlap = overlap_sum - problem.overlap[i] + problem.overlap[c]
+            trial = problem._score(logdet, levels.level_counts, trial_overlap)[0]
+
+            delta = np.log(trial) - np.log(current)
+            if delta <= 0 or rng.random() < np.exp(-delta / temperature):
+                M, overlap_sum, current = trial_M, trial_overlap, trial
+                in_design[i] = False
+                in_design[c] = True
+                design[pos] = c
+                if current < best:
+                    best_design, best = design.copy(), current
+            else:
+                levels.swap(c, i)
+
+        temperature *= cooling
+        if step % trace_every == 0:
+            trace.append(best)
+    return best_design, trace
+
+
+# Problem of the running search, set once per worker process by _init_worker()
+_problem = None
+
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def _run_start(method, seed_sequence, problem=None):
+    problem = _problem if problem is None else problem
+    rng = np.random.default_rng(seed_sequence)
+    search = _exchange if method == "exchange" else _annealing
+    design, trace = search(problem, rng)
+    score, d_error, balance, overlap = problem.metrics(design)
+    return {"design": design, "score": score, "d_error": d_error, "balance": balance,
+            "overlap": overlap, "trace": trace}
+
+
+# --- 3. MANY STARTS IN PARALLEL ---
+
+def multistart_search(candidates, n, starts=8, method="exchange", seed=0, M0=None, base_counts=None,
+                      beta=None, weights=(0.5, 0.5), workers=None):
+    """
+    Best-of-`starts` selection of `n` rows from `candidates` (a CodedDesign).
+
+    Start s uses child s of SeedSequence(seed), so results do not depend on
+    the number of workers. `M0` / `base_counts`: information matrix and level
+    counts of the baskets already picked. With workers=1 (or one start) the
+    search runs in this process.
+
+    Returns a dict: rows (CodedDesign), information matrix M, level counts,
+    score / d_error / balance / overlap of the best start, its convergence
+    trace, and the metrics of every start.
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method '{method}' (expected one of {', '.join(SEARCH_METHODS)}).")
+    frame = candidates.to_frame()
+    X, _ = mnl_design_matrix(frame)
+    U = information_factors(X, beta)
+    flat = flat_level_codes(candidates)
+    problem = _Problem(U, flat, candidates.space.radices, overlap_per_scenario(X), min(n, len(candidates)),
+                       M0, base_counts, weights)
+
+    seeds = np.random.SeedSequence(seed).spawn(starts)
+    if workers == 1 or starts == 1:
+        results = [_run_start(method, s, problem) for s in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(problem,)) as pool:
+            results = list(pool.map(_run_start, [method] * starts, seeds))
+
+    best = min(results, key=lambda r: r["score"])
+    design = best["design"]
+    return {
+        "rows": candidates.take(design),
+        "M": np.einsum('skj,slj->kl', U[design], U[design]),
+        "counts": problem.levels(design).level_counts,
+        "score": best["score"], "d_error": best["d_error"],
+        "balance": best["balance"], "overlap": best["overlap"],
+        "trace": best["trace"],
+        "starts": [{k: r[k] for k in ("score", "d_error", "balance", "overlap")} for r in results],
+    }
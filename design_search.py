@@ -0,0 +1,318 @@
+import re
+from statistics import NormalDist
+
+import numpy as np
+
+# --- 1. MNL CODING OF THE FIVE ALTERNATIVES ---
+
+# Order of the alternatives in every choice set (Shop is the reference for the ASCs)
+ALTERNATIVES = ["Home_Standard", "Home_Express", "Locker_Standard", "Locker_Express", "Shop_Collect"]
+
+# Midpoint (km) of the distance labels used in the sidebar
+DISTANCE_KM = {
+    "<1 km": 0.5, "1-2 km": 1.5, "2-3 km": 2.5,
+    "2-4 km": 3.0, "4-6 km": 5.0, ">6 km": 7.0,
+}
+
+
+def distance_to_km(label):
+    """Distance label -> km. Unknown labels fall back to the midpoint of their numbers."""
+    if label in DISTANCE_KM:
+        return DISTANCE_KM[label]
+    numbers = [float(x) for x in re.findall(r"\d+(?:\.\d+)?", str(label))]
+    if not numbers:
+        return 0.0
+    if str(label).strip().startswith("<"):
+        return numbers[0] / 2
+    if str(label).strip().startswith(">"):
+        return numbers[0] + 1
+    return sum(numbers) / len(numbers)
+
+
+def _is_green(df, col):
+    return (df[col].astype(str).str.upper() == "TRUE").to_numpy(dtype=float)
+
+
+def mnl_design_matrix(df):
+    """
+    Codes every scenario as a (n_alternatives, n_params) attribute matrix.
+    Returns (X, param_names) with X of shape (n_scenarios, 5, n_params).
+
+    Parameters: 4 ASCs, cost (Final_Cost / Express price), top-up gap,
+    and - when the columns exist - fossil-free badge and distance (km).
+    """
+    n = len(df)
+    zeros = np.zeros(n)
+
+    cost = [df['Home_Final_Cost'], df['Home_Exp_Price'], df['Locker_Final_Cost'],
+            df['Locker_Exp_Price'], df['Shop_Final_Cost']]
+    gap = [df['Home_TopUp_Gap'], zeros, df['Locker_TopUp_Gap'], zeros, df['Shop_TopUp_Gap']]
+
+    columns = {"Cost": cost, "TopUp_Gap": gap}
+
+    if {'Home_Is_Green', 'Locker_Is_Green', 'Shop_Is_Green'} <= set(df.columns):
+        columns["Green"] = [_is_green(df, 'Home_Is_Green'), zeros, _is_green(df, 'Locker_Is_Green'),
+                            zeros, _is_green(df, 'Shop_Is_Green')]
+
+    if {'Locker_Distance', 'Shop_Distance'} <= set(df.columns):
+        locker_km = df['Locker_Distance'].map(distance_to_km).to_numpy(dtype=float)
+        shop_km = df['Shop_Distance'].map(distance_to_km).to_numpy(dtype=float)
+        columns["Distance_km"] = [zeros, zeros, locker_km, locker_km, shop_km]
+
+    n_alt = len(ALTERNATIVES)
+    param_names = [f"ASC_{alt}" for alt in ALTERNATIVES[:-1]] + list(columns)
+    X = np.zeros((n, n_alt, len(param_names)))
+
+    # Alternative-specific constants
+    for j in range(n_alt - 1):
+        X[:, j, j] = 1.0
+
+    # Generic attributes
+    for k, per_alt in enumerate(columns.values(), start=n_alt - 1):
+        for j, values in enumerate(per_alt):
+            X[:, j, k] = np.asarray(values, dtype=float)
+
+    return X, param_names
+
+
+def information_factors(X, beta=None):
+    """
+    Square-root factors of the per-scenario MNL information matrices.
+
+    With choice probabilities p, scenario s contributes
+        M_s = X_s' (diag(p) - p p') X_s = U_s U_s'
+    where U_s = X_s' (diag(sqrt p) - p sqrt(p)'), of shape (n_params, n_alternatives).
+    beta=None means the usual utility-neutral prior (all coefficients zero).
+    """
+    n, n_alt, n_params = X.shape
+    if beta is None:
+        p = np.full((n, n_alt), 1.0 / n_alt)
+    else:
+        v = X @ np.asarray(beta, dtype=float)
+        v -= v.max(axis=1, keepdims=True)
+        p = np.exp(v)
+        p /= p.sum(axis=1, keepdims=True)
+
+    sqrt_p = np.sqrt(p)
+    # B_s = diag(sqrt p) - p sqrt(p)'   -> (n, n_alt, n_alt)
+    B = np.einsum('sj,jk->sjk', sqrt_p, np.eye(n_alt)) - p[:, :, None] * sqrt_p[:, None, :]
+    return np.transpose(X, (0, 2, 1)) @ B
+
+
+def d_error(U, ridge=0.0):
+    """D-error = det(M)^(-1/K) of the design whose information factors are U."""
+    n_params = U.shape[1]
+    M = np.einsum('skj,slj->kl', U, U) + ridge * np.eye(n_params)
+    sign, logdet = np.linalg.slogdet(M)
+    if sign <= 0:
+        return np.inf
+    return float(np.exp(-logdet / n_params))
+
+
+def overlap_per_attribute(X):
+    """
+    Attribute overlap of every choice set, per generic attribute: the share
+    of alternative pairs showing the same value. Alternatives that never
+    carry an attribute (e.g. no top-up gap for Express) are left out of its
+    pairs, and attributes carried by fewer than two alternatives are
+    skipped. X: (S, J, K) from mnl_design_matrix(); the ASCs are skipped.
+    Returns ((S, n_attributes) overlaps, their column numbers in X).
+    """
+    S, J, K = X.shape
+    applies = X.any(axis=0)  # (J, K): alternative j carries attribute k somewhere
+    overlaps, attributes = [], []
+    for k in range(J - 1, K):
+        alts = np.flatnonzero(applies[:, k])
+        if len(alts) < 2:
+            continue
+        values = X[:, alts, k]
+        equal = values[:, :, None] == values[:, None, :]
+        n_pairs = len(alts) * (len(alts) - 1)
+        overlaps.append((equal.sum(axis=(1, 2)) - len(alts)) / n_pairs)
+        attributes.append(k)
+    return np.column_stack(overlaps) if overlaps else np.zeros((S, 0)), attributes
+
+
+def overlap_per_scenario(X):
+    """Attribute overlap of every choice set, averaged over the generic attributes (see overlap_per_attribute)."""
+    overlaps, _ = overlap_per_attribute(X)
+    if not overlaps.shape[1]:
+        return np.zeros(len(X))
+    return overlaps.mean(axis=1)
+
+
+# --- 2. MODIFIED FEDOROV EXCHANGE ---
+
+def fedorov_exchange(U, n, seed=0, M0=None, max_passes=20, ridge=1e-6, tol=1e-9):
+    """
+    Picks `n` rows of the candidate set that minimize the D-error.
+
+    U: information factors of the candidates, (n_candidates, K, J).
+    M0: information already collected elsewhere (e.g. the other basket).
+    ridge: small multiple of I added to M, so M stays invertible while a
+    row is taken out even when the design alone is rank deficient.
+
+    Modified Fedorov: every design row in turn is swapped for the candidate
+    that increases det(M) the most. Each swap is scored with the matrix
+    determinant lemma on the current inverse,
+        det(M - U_i U_i' + U_c U_c') = det(M - U_i U_i') * det(I + U_c' A U_c),
+    where A = (M - U_i U_i')^-1 comes from a Woodbury down-date, so no
+    information matrix is rebuilt or re-inverted per candidate.
+
+    Returns (design row numbers, D-error).
+    """
+    n_candidates, K, J = U.shape
+    if n >= n_candidates:
+        design = np.arange(n_candidates)
+        return design, d_error(U[design], ridge=ridge)
+
+    rng = np.random.default_rng(seed)
+    design = rng.choice(n_candidates, size=n, replace=False)
+    in_design = np.zeros(n_candidates, dtype=bool)
+    in_design[design] = True
+
+    eye_J = np.eye(J)
+    base = (np.zeros((K, K)) if M0 is None else np.asarray(M0, dtype=float)) + ridge * np.eye(K)
+    M = base + np.einsum('skj,slj->kl', U[design], U[design])
+    M_inv = np.linalg.inv(M)
+    logdet = np.linalg.slogdet(M)[1]
+
+    for _ in range(max_passes):
+        improved = False
+        for pos in range(n):
+            # 1. Remove the current row (Woodbury down-date)
+            U_i = U[design[pos]]
+            S = eye_J - U_i.T @ M_inv @ U_i
+            A = M_inv + M_inv @ U_i @ np.linalg.solve(S, U_i.T @ M_inv)
+            logdet_minus = logdet + np.linalg.slogdet(S)[1]
+
+            # 2. Score every candidate at once: det(I + U_c' A U_c)
+            W = np.transpose(U, (0, 2, 1)) @ (A @ U)
+            W += eye_J
+            sign_c, gain = np.linalg.slogdet(W)
+            gain[(sign_c <= 0) | in_design] = -np.inf
+            gain_current = np.linalg.slogdet(eye_J + U_i.T @ A @ U_i)[1]
+
+            best = int(np.argmax(gain))
+            if gain[best] <= gain_current + tol:
+                continue
+
+            # 3. Swap and update the inverse (Woodbury up-date)
+            U_c = U[best]
+            T = eye_J + U_c.T @ A @ U_c
+            M_inv = A - A @ U_c @ np.linalg.solve(T, U_c.T @ A)
+            M = M - U_i @ U_i.T + U_c @ U_c.T
+            logdet = logdet_minus + gain[best]
+
+            in_design[design[pos]] = False
+            in_design[best] = True
+            design[pos] = best
+            improved = True
+
+        # Refresh once per pass to stop rounding errors from piling up
+        M_inv = np.linalg.inv(M)
+        logdet = np.linalg.slogdet(M)[1]
+        if not improved:
+            break
+
+    return design, float(np.exp(-logdet / K))
+
+
+def optimal_scenarios(candidates_df, n, seed=0, M0=None, beta=None):
+    """
+    D-optimal selection of `n` scenarios from a filtered, de-duplicated frame.
+    Returns (selected rows, D-error, information matrix of the selection).
+    """
+    X, _ = mnl_design_matrix(candidates_df)
+    U = information_factors(X, beta)
+    design, error = fedorov_exchange(U, n, seed=seed, M0=M0)
+    M = np.einsum('skj,slj->kl', U[design], U[design])
+    return candidates_df.iloc[design], error, M
+
+
+# --- 3. BAYESIAN D-ERROR (Db) ---
+
+# Normal priors (mean, sd) per coefficient; unlisted parameters (the ASCs) are fixed at 0
+DEFAULT_PRIORS = {
+    "Cost": (-0.03, 0.015),
+    "TopUp_Gap": (-0.004, 0.002),
+    "Green": (0.3, 0.15),
+    "Distance_km": (-0.2, 0.1),
+}
+
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53]
+
+
+def halton_draws(n_draws, dim, skip=10):
+    """(n_draws, dim) Halton sequence in (0, 1), one prime base per dimension."""
+    if dim > len(PRIMES):
+        raise ValueError(f"At most {len(PRIMES)} random coefficients are supported.")
+    index = np.arange(skip + 1, skip + n_draws + 1)
+    draws = np.empty((n_draws, dim))
+    for d, base in enumerate(PRIMES[:dim]):
+        # Radical inverse of every index in base `base`, digit by digit
+        n = index.copy()
+        value = np.zeros(n_draws)
+        factor = 1.0 / base
+        while n.any():
+            n, digit = np.divmod(n, base)
+            value += digit * factor
+            factor /= base
+        draws[:, d] = value
+    return draws
+
+
+class BayesianDError:
+    """
+    Db-error of a design: the D-error averaged over draws from the priors.
+
+    The coefficient draws are built once (Halton points mapped through the
+    normal quantile function). evaluate() then scores a design for all
+    draws in one batch of tensor products, so it can be called inside a
+    search loop.
+    """
+
+    def __init__(self, param_names, priors=None, n_draws=2_000):
+        priors = DEFAULT_PRIORS if priors is None else priors
+        self.param_names = list(param_names)
+        random_params = [k for k, name in enumerate(self.param_names) if name in priors and priors[name][1] > 0]
+
+        self.betas = np.zeros((n_draws, len(self.param_names)))
+        for k, name in enumerate(self.param_names):
+            if name in priors:
+                self.betas[:, k] = priors[name][0]
+
+        if random_params:
+            uniforms = halton_draws(n_draws, len(random_params))
+            normals = np.vectorize(NormalDist().inv_cdf)(uniforms)
+            for d, k in enumerate(random_params):
+                self.betas[:, k] += priors[self.param_names[k]][1] * normals[:, d]
+
+    def information(self, X):
+        """MNL information matrix of design X (S, J, K) for every draw -> (R, K, K)."""
+        S, J, K = X.shape
+
+        # Choice probabilities for every draw and scenario: (R, S, J)
+        V = (X.reshape(S * J, K) @ self.betas.T).T.reshape(-1, S, J)
+        V -= V.max(axis=2, keepdims=True)
+        P = np.exp(V)
+        P /= P.sum(axis=2, keepdims=True)
+
+        # sum_s sum_j p_sj x_sj x_sj'   (one matrix product over all draws)
+        outer = (X[:, :, :, None] * X[:, :, None, :]).reshape(S * J, K * K)
+        M = (P.reshape(-1, S * J) @ outer).reshape(-1, K, K)
+
+        # - sum_s (X_s' p_s)(X_s' p_s)'
+        Z = np.matmul(P.transpose(1, 0, 2), X).transpose(1, 0, 2)  # (R, S, K)
+        M -= np.matmul(Z.transpose(0, 2, 1), Z)
+        return M
+
+    def d_errors(self, X):
+        """D-error of design X for every draw -> (R,). Singular draws give inf."""
+        K = X.shape[2]
+        sign, logdet = np.linalg.slogdet(self.information(X))
+        return np.where(sign > 0, np.exp(-logdet / K), np.inf)
+
+    def evaluate(self, X):
+        """Db-error of design X (S, J, K)."""
+        return float(self.d_errors(X).mean())
@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Spaces up to this size are sampled through a full random permutation;
+# larger ones draw random indices and skip the ones already drawn.
+PERMUTATION_LIMIT = 10_000_000
+
+
+# --- 1. IMPLICIT DESIGN SPACE ---
+
+class DesignSpace:
+    """
+    The Cartesian product of the attribute levels, without building it.
+
+    Row `i` of the full factorial is decoded with mixed-radix arithmetic:
+    every attribute is one "digit" whose base is its number of levels, and
+    the last attribute varies fastest (same order as itertools.product).
+    """
+
+    def __init__(self, levels):
+        self.columns = list(levels)
+        self.levels = {col: list(opts) for col, opts in levels.items()}
+        # pd.Series keeps the dtypes of the full factorial (int64, bool, strings)
+        self.level_values = [pd.Series(list(opts)).to_numpy() for opts in levels.values()]
+        self.radices = np.array([len(opts) for opts in levels.values()], dtype=np.int64)
+
+        # Python int: the product can exceed what an int64 holds for silly inputs
+        self.size = math.prod(int(r) for r in self.radices)
+
+        # Place value of every digit (the last attribute has place value 1)
+        strides = np.ones(len(self.radices), dtype=np.int64)
+        for i in range(len(self.radices) - 2, -1, -1):
+            strides[i] = strides[i + 1] * self.radices[i + 1]
+        self.strides = strides
+
+        # Smallest unsigned integer type that can hold every level code
+        self.code_dtype = np.min_scalar_type(max(int(self.radices.max(initial=1)) - 1, 0))
+
+    def __repr__(self):
+        return f"DesignSpace({len(self.columns)} attributes, {self.size:,} combinations)"
+
+    def decode_codes(self, indices):
+        """Row indices -> (n, n_attributes) array of level codes."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return ((indices[:, None] // self.strides) % self.radices).astype(self.code_dtype)
+
+    def encode_codes(self, codes):
+        """(n, n_attributes) array of level codes -> row indices."""
+        return np.asarray(codes, dtype=np.int64) @ self.strides
+
+    def decode(self, indices):
+        """Row indices -> DataFrame with the same columns as generate_full_factorial()."""
+        indices = np.asarray(indices, dtype=np.int64)
+        codes = self.decode_codes(indices)
+        data = {col: values[codes[:, i]] for i, (col, values) in enumerate(zip(self.columns, self.level_values))}
+        return pd.DataFrame(data, index=pd.Index(indices))
+
+    def iter_index_batches(self, batch_size, rng, max_draws=None):
+        """
+        Yields random batches of row indices, without replacement.
+        Stops once every index has been drawn, or after `max_draws` random
+        draws (repeats included).
+        """
+        stop = self.size if max_draws is None else min(self.size, max_draws)
+        if self.size <= PERMUTATION_LIMIT:
+            order = rng.permutation(self.size)
+            for start in range(0, stop, batch_size):
+                yield order[start:min(start + batch_size, stop)]
+            return
+
+        # Huge space: repeats are rare, so draw with replacement and drop them
+        drawn = np.empty(0, dtype=np.int64)
+        n_draws = 0
+        while len(drawn) < self.size and n_draws < stop:
+            batch = rng.integers(0, self.size, size=min(batch_size, stop - n_draws), dtype=np.int64)
+            n_draws += len(batch)
+            _, first = np.unique(batch, return_index=True)
+            batch = batch[np.sort(first)]
+            batch = batch[~np.isin(batch, drawn)]
+            drawn = np.union1d(drawn, batch)
+            yield batch
+
@@ -0,0 +1,196 @@
+"""
+Many randomized versions (blocks) of the design, generated on all cores.
+
+    python -m design_versions spec.json --versions 500 --out versions/
+    python -m design_versions spec.json --versions 500 --out versions/ --only 17
+
+Every version is drawn from the same filtered, de-duplicated candidates
+(see design_generator for the spec format) and is level-balanced: every
+level of every attribute appears as evenly as the filters allow. Version i
+uses seed SeedSequence(seed).spawn(...)[i], so one version can be
+regenerated on its own (--only) and gives the same file.
+
+Versions are written as <out>/<spec name>_v0001.csv (.parquet, .json) plus
+a versions.json manifest with the seed and level balance of each version.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from design_balance import balance_objective, balance_targets, flat_level_codes, level_imbalance
+from design_codes import unique_visuals_per_context
+from design_diagnostics import DesignDiagnostics
+from design_generator import export_design, load_spec
+from design_space import DesignSpace
+
+# Every basket draws its version from a random pool of this many candidates
+DEFAULT_POOL_SIZE = 2_000
+
+
+# --- 1. SEEDS ---
+
+def version_seed(master_seed, version):
+    """Seed of one version: child `version` of SeedSequence(master_seed), as an int."""
+    child = np.random.SeedSequence(master_seed, spawn_key=(version,))
+    return int(child.generate_state(1, dtype=np.uint64)[0])
+
+
+# --- 2. LEVEL-BALANCED SELECTION ---
+
+def level_balanced_sample(candidates, n, rng, base_counts=None, max_passes=10):
+    """
+    Picks `n` rows of `candidates` (a CodedDesign) with the most even level counts.
+
+    Starts from a random draw and swaps rows for candidates while that lowers
+    sum((count - target)^2) over all shown (attribute, level) pairs.
+    `base_counts` are the counts of rows already in the version (the other
+    baskets). Moving one row out of level r and into level x changes the sum
+    by about 2 * (d_x - d_r) + 2 per attribute (d = count - target), so each
+    swap is scored for all candidates in one array operation; the best one is
+    then checked exactly before it is made.
+
+    Returns (selected CodedDesign, updated counts).
+    """
+    flat = flat_level_codes(candidates)
+    radices = candidates.space.radices
+    n = min(n, len(candidates))
+    design = rng.choice(len(candidates), size=n, replace=False)
+
+    in_design = np.zeros(len(candidates), dtype=bool)
+    in_design[design] = True
+    levels = DesignDiagnostics.level_tracker(flat, int(radices.sum()) + len(radices), design, base_counts)
+    counts = levels.level_counts  # updated in place by levels.swap()
+
+    current = balance_objective(counts, radices)
+    for _ in range(max_passes):
+        improved = False
+        for pos in range(n):
+            out_levels = flat[design[pos]]
+            d = counts - balance_targets(counts, radices)
+            change = 2 * (d[flat] - d[out_levels]) + 2
+            change[flat == out_levels] = 0
+            delta = change.sum(axis=1)
+            delta[in_design] = np.inf
+
+            best = int(np.argmin(delta))
+            if delta[best] >= -1e-9:
+                continue
+            levels.swap(design[pos], best)
+            trial_objective = balance_objective(counts, radices)
+            if trial_objective >= current - 1e-9:
+                levels.swap(best, design[pos])
+                continue
+
+            current = trial_objective
+            in_design[design[pos]] = False
+            in_design[best] = True
+            design[pos] = best
+            improved = True
+        if not improved:
+            break
+
+    return candidates.take(design), counts
+
+
+# --- 3. ONE VERSION ---
+
+# Candidates of every basket, set once per worker process by _init_worker()
+_candidates = None
+
+
+def _init_worker(candidates):
+    global _candidates
+    _candidates = candidates
+
+
+def build_version(version, master_seed, pool_size=DEFAULT_POOL_SIZE, candidates=None):
+    """
+    Design version `version`: a level-balanced draw of n rows per basket.
+    Returns (final_design, notes, level imbalance).
+    """
+    candidates = _candidates if candidates is None else candidates
+    rng = np.random.default_rng(version_seed(master_seed, version))
+    counts = None
+    notes = []
+    final_dfs = []
+
+    for unique_visuals in candidates:
+        ctx = unique_visuals.ctx
+        if len(unique_visuals) < ctx['n']:
+            notes.append(f"Note: Only {len(unique_visuals)} unique scenarios exist for {ctx['label']}. Returning all of them.")
+        # A random pool per version keeps the versions independent and the swaps cheap
+        pool = unique_visuals.take(rng.permutation(len(unique_visuals))[:max(pool_size, ctx['n'])])
+        selected, counts = level_balanced_sample(pool, ctx['n'], rng, base_counts=counts)
+        final_dfs.append(selected.to_frame())
+
+    final_design = pd.concat(final_dfs).reset_index(drop=True)
+    final_design.index.name = "Scenario_ID"
+    final_design.index += 1 # Start ID at 1 for readability
+    final_design.insert(0, "Version", version)
+    return final_design, notes, level_imbalance(counts, candidates[0].space.radices)
+
+
+def _write_version(version, master_seed, pool_size, out_prefix, formats):
+    final_design, notes, imbalance = build_version(version, master_seed, pool_size)
+    written = export_design(final_design, f"{out_prefix}_v{version:04d}", formats)
+    return {"version": version, "seed": version_seed(master_seed, version),
+            "scenarios": len(final_design), "level_imbalance": imbalance,
+            "files": [os.path.basename(path) for path in written], "notes": notes}
+
+
+# --- 4. MANY VERSIONS ON A PROCESS POOL ---
+
+def generate_versions(spec, versions, out_prefix, formats=("csv",), workers=None, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Writes one file set per version index in `versions`, spread over `workers`
+    processes (default: all cores). The candidates are built once here and
+    handed to every worker when it starts. Returns the manifest entries.
+    """
+    space = DesignSpace(spec["levels"])
+    candidates = unique_visuals_per_context(space, spec["contexts"], spec["display_cols"], spec["constraints"])
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(candidates,)) as pool:
+        futures = [pool.submit(_write_version, v, spec["seed"], pool_size, out_prefix, formats) for v in versions]
+        return [future.result() for future in futures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate many level-balanced design versions in parallel.")
+    parser.add_argument("spec", help="JSON spec file (see design_generator)")
+    parser.add_argument("--versions", type=int, default=100, help="number of versions (default: 100)")
+    parser.add_argument("--only", type=int, nargs="+", default=None, help="regenerate just these version numbers")
+    parser.add_argument("--out", default="versions", help="output directory (default: versions/)")
+    parser.add_argument("--formats", nargs="+", default=["csv"], choices=["csv", "parquet", "json"])
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="random candidates per basket and version (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"{args.spec}: {e}\n")
+
+    os.makedirs(args.out, exist_ok=True)
+    name = os.path.splitext(os.path.basename(args.spec))[0]
+    versions = args.only if args.only is not None else range(1, args.versions + 1)
+    manifest = generate_versions(spec, versions, os.path.join(args.out, name), args.formats,
+                                 workers=args.workers, pool_size=args.pool_size)
+
+    for entry in manifest:
+        for note in entry["notes"]:
+            print(f"v{entry['version']:04d}: {note}", file=sys.stderr)
+    if args.only is None:
+        with open(os.path.join(args.out, "versions.json"), "w", encoding="utf-8") as f:
+            json.dump({"spec": os.path.basename(args.spec), "master_seed": spec["seed"], "versions": manifest}, f, indent=1)
+    worst = max(entry["level_imbalance"] for entry in manifest)
+    print(f"{len(manifest)} versions -> {args.out} (worst level imbalance: {worst})")
+
+
+if __name__ == "__main__":
+    main()
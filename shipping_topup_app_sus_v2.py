@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from survey_runtime import DesignRegistry
+
 # --- 1. CONFIGURATION & STATE ---
 st.set_page_config(page_title="Checkout Survey", layout="centered")
 
@@ -8,10 +10,16 @@ if 'current_q' not in st.session_state:
     st.session_state.current_q = 0
 if 'answers' not in st.session_state:
     st.session_state.answers = []
-if 'design_df' not in st.session_state:
-    st.session_state.design_df = None
+# Sessions keep only the key of their design in the shared registry
+if 'design_key' not in st.session_state:
+    st.session_state.design_key = None
 
 # --- 2. HELPER FUNCTIONS ---
+@st.cache_resource
+def design_registry():
+    """Designs shared by every session of this server process (parsed once, read-only)."""
+    return DesignRegistry()
+
 def submit_answer(choice_label, scenario_id, context_label):
     st.session_state.answers.append({
         "Scenario_ID": scenario_id,
@@ -40,15 +48,16 @@ def clean_display_text(text, cart_value):
 # --- 3. APP HEADER & UPLOAD ---
 st.title("🛍️ Checkout Experiment")
 
-if st.session_state.design_df is None:
+if st.session_state.design_key not in design_registry():
     st.info("Please upload the 'shipping_topup_design.csv' file.")
     uploaded_file = st.file_uploader("Upload Design CSV", type=['csv'])
     
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            if 'Context_Cart_Value' in df.columns:
-                st.session_state.design_df = df
+            design_key = design_registry().load_csv(uploaded_file.getvalue(),
+                                                    accept=lambda df: 'Context_Cart_Value' in df.columns)
+            if design_key is not None:
+                st.session_state.design_key = design_key
                 st.rerun()
             else:
                 st.error("CSV format incorrect.")
@@ -69,12 +78,12 @@ if st.session_state.design_df is None:
             'Home_Is_Green': [True, False],
             'Locker_Is_Green': [False, True]
         }
-        st.session_state.design_df = pd.DataFrame(data)
+        st.session_state.design_key = design_registry().load_frame("demo_sus_v2", pd.DataFrame(data))
         st.rerun()
     st.stop()
 
 # --- 4. SURVEY INTERFACE ---
-df = st.session_state.design_df
+df = design_registry()[st.session_state.design_key]
 q_idx = st.session_state.current_q
 
 if q_idx >= len(df):
@@ -94,7 +103,7 @@ else:
             go_back()
             st.rerun()
 
-    row = df.iloc[q_idx]
+    row = df[q_idx]
     cart_val = row['Context_Cart_Value']
     home_disp = clean_display_text(row['Home_Display'], cart_val)
     
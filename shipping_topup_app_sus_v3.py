@@ -1,58 +1,96 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+from checkout_component import checkout_scenarios
+from survey_runtime import DesignRegistry, scenario_sequence
 
 # --- 1. CONFIGURATION & STATE ---
 st.set_page_config(page_title="Checkout Survey", layout="centered")
 
+# Scenario screens: Streamlit buttons (one server round-trip per click), the same
+# screen as one HTML block with a single radio ("compact"), or the checkout component
+# that runs the scenarios in the browser and sends the answers per basket ("block")
+# or all at the end ("all")
+RENDER_MODES = {
+    "Buttons (one server round-trip per click)": "buttons",
+    "Compact (one HTML block and one choice list)": "compact",
+    "Checkout component, answers sent per basket": "block",
+    "Checkout component, answers sent at the end": "all",
+}
+
 # Initialize Session State
 if 'current_q' not in st.session_state:
     st.session_state.current_q = 0
 if 'answers' not in st.session_state:
     st.session_state.answers = []
-if 'design_df' not in st.session_state:
-    st.session_state.design_df = None
+# Sessions keep only the key of their design in the shared registry
+if 'design_key' not in st.session_state:
+    st.session_state.design_key = None
 if 'survey_started' not in st.session_state:
     st.session_state.survey_started = False
+# Personalized carts: on/off, and the cart offset drawn for this respondent
+if 'personal_carts' not in st.session_state:
+    st.session_state.personal_carts = False
+if 'cart_offset' not in st.session_state:
+    st.session_state.cart_offset = None
+if 'render_mode' not in st.session_state:
+    st.session_state.render_mode = "buttons"
 
 # --- 2. HELPER FUNCTIONS ---
-def submit_answer(choice_label, scenario_id, context_label):
+@st.cache_resource
+def design_registry():
+    """Designs shared by every session of this server process (parsed once, read-only)."""
+    return DesignRegistry()
+
+def submit_answer(choice_label, scenario_id, context_label, cart_value):
     st.session_state.answers.append({
         "Scenario_ID": scenario_id,
         "Context": context_label,
+        "Cart_Value": int(cart_value),
         "Choice": choice_label
     })
     st.session_state.current_q += 1
 
+def submit_choice(key, plan):
+    """Radio callback of the compact screen: stores the chosen answer label."""
+    answer = st.session_state[key]
+    # A fresh (unselected) radio when the respondent comes Back to this question
+    del st.session_state[key]
+    submit_answer(answer, plan.scenario_id, plan.context_label, plan.cart_value)
+
 def go_back():
     if st.session_state.current_q > 0:
         st.session_state.current_q -= 1
         if st.session_state.answers:
             st.session_state.answers.pop()
 
-def clean_display_text(text, cart_value):
-    if "Add" in str(text):
-        try:
-            parts = text.split("Add ")
-            gap = int(parts[1])
-            if gap > (cart_value * 1.5):
-                 return text.split(" or")[0]
-        except:
-            pass
-    return text
-
 # --- 3. APP LOGIC ---
 
 # A. FILE UPLOAD & SETUP (Runs first)
-if st.session_state.design_df is None:
+if st.session_state.design_key not in design_registry():
     st.title("🛍️ Setup Experiment")
     st.info("Please upload the 'shipping_topup_design.csv' file.")
+    personal_carts = st.checkbox("Draw a cart value per respondent (offers computed live from the price and threshold columns)")
+    st.session_state.render_mode = RENDER_MODES[st.radio("Scenario screen", list(RENDER_MODES))]
     uploaded_file = st.file_uploader("Upload Design CSV", type=['csv'])
     
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            if 'Context_Cart_Value' in df.columns:
-                st.session_state.design_df = df
+            def usable(df):
+                # Render plans exist when the cart and the five display columns are there
+                if df.render_plans is None:
+                    return False
+                if personal_carts:
+                    # The offer tables of every cart offset are built once with the shared design,
+                    # here, so a design they fail on is not registered either
+                    df.offer_tables
+                return True
+
+            design_key = design_registry().load_csv(uploaded_file.getvalue(), accept=usable)
+            if design_key is not None:
+                st.session_state.design_key = design_key
+                st.session_state.personal_carts = personal_carts and design_registry()[design_key].offer_tables is not None
                 st.rerun()
             else:
                 st.error("CSV format incorrect.")
@@ -75,7 +113,7 @@ if st.session_state.design_df is None:
             'Locker_Distance': ['<1 km', '1-2 km'],
             'Shop_Distance': ['2-4 km', '4-6 km']
         }
-        st.session_state.design_df = pd.DataFrame(data)
+        st.session_state.design_key = design_registry().load_frame("demo_sus_v3", pd.DataFrame(data))
         st.rerun()
     st.stop()
 
@@ -100,48 +138,73 @@ if not st.session_state.survey_started:
     
     if st.button("Start Checkout Experiment", type="primary"):
         st.session_state.survey_started = True
+        if st.session_state.personal_carts:
+            offer_tables = design_registry()[st.session_state.design_key].offer_tables
+            st.session_state.cart_offset = offer_tables.draw_offset(np.random.default_rng())
         st.rerun()
     st.stop()
 
 # --- 4. MAIN SURVEY INTERFACE ---
-df = st.session_state.design_df
-q_idx = st.session_state.current_q
+df = design_registry()[st.session_state.design_key]
 
-if q_idx >= len(df):
-    st.balloons()
-    st.success("✅ Survey Complete!")
-    st.write("Thank you for your participation.")
-    
-    results_df = pd.DataFrame(st.session_state.answers)
-    # st.dataframe(results_df) # Optional: Hide table if you don't want users to see it
-    
-    csv = results_df.to_csv(index=False).encode('utf-8')
-    st.download_button("Download My Responses", csv, "results.csv", "text/csv")
-    
-    if st.button("Restart"):
-        st.session_state.current_q = 0
-        st.session_state.answers = []
-        st.session_state.survey_started = False
+# --- RENDER FUNCTION (HIGH VISIBILITY) ---
+def render_option_row(option, plan):
+    with st.container():
+        c1, c2 = st.columns([1.6, 1])
+        
+        # --- LEFT: INFO (Bold & Clear) ---
+        with c1:
+            # 1. Title (Larger)
+            if option.is_express:
+                st.markdown(f"#### ⚡ {option.title}")
+            else:
+                st.markdown(f"#### {option.title}")
+            
+            # 2. Details (Bold)
+            details = f"**⏱️ {option.subtitle}**"
+            if option.distance:
+                details += f" &nbsp;•&nbsp; **📍 {option.distance}**"
+            
+            st.markdown(details, unsafe_allow_html=True)
+            
+            # 3. Green Badge
+            if option.is_green:
+                st.markdown("🌿 <span style='color:#2e7d32; font-weight:bold;'>Fossil Free Delivery</span>", unsafe_allow_html=True)
+
+        # --- RIGHT: BUTTONS (Explicit Actions) ---
+        with c2:
+            # Add spacing to align buttons with text better
+            st.write("") 
+            
+            # Top-up offers: "Add ... Get FREE Delivery" then "Pay ..."; otherwise one FREE / Pay button.
+            # The answer is stored in the click callback, which the fragment rerun then shows.
+            for key, label, answer, style_type in option.buttons:
+                st.button(label, key=key, type=style_type, use_container_width=True, on_click=submit_answer,
+                          args=(answer, plan.scenario_id, plan.context_label, plan.cart_value))
+        
+        st.divider()
+
+# A click inside the fragment reruns only the fragment (progress header + scenario);
+# the rest of the page is neither re-executed nor re-sent.
+@st.fragment
+def scenario_panel():
+    q_idx = st.session_state.current_q
+    if q_idx >= len(df):
+        # Last answer given: the completion page lives outside the fragment
         st.rerun()
-else:
+
     # Top Navigation
     col_back, col_prog = st.columns([1, 4])
     with col_back:
         if q_idx > 0:
-            if st.button("⬅️ Back"):
-                go_back()
-                st.rerun()
+            st.button("⬅️ Back", on_click=go_back)
     with col_prog:
         st.progress((q_idx) / len(df))
         st.caption(f"Question {q_idx + 1} of {len(df)}")
 
-    row = df.iloc[q_idx]
-    cart_val = row['Context_Cart_Value']
-    home_disp = clean_display_text(row['Home_Display'], cart_val)
-    
-    # Attributes
-    home_is_green = row['Home_Is_Green'] if 'Home_Is_Green' in row else False
-    locker_is_green = row['Locker_Is_Green'] if 'Locker_Is_Green' in row else False
+    # Compiled when the design was loaded: no parsing and no pandas on a click
+    plan = df.plan(q_idx, st.session_state.cart_offset)
+    cart_val = plan.cart_value
 
     # Sticky Header
     st.markdown(f"""
@@ -151,105 +214,56 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-    # --- RENDER FUNCTION (HIGH VISIBILITY) ---
-    def render_option_row(title, subtitle, display_text, col_key, label_base, context_label, scenario_id, 
-                          is_green=False, is_express=False, distance=None):
-        with st.container():
-            c1, c2 = st.columns([1.6, 1])
-            
-            # --- LEFT: INFO (Bold & Clear) ---
-            with c1:
-                # 1. Title (Larger)
-                if is_express:
-                    st.markdown(f"#### ⚡ {title}")
-                else:
-                    st.markdown(f"#### {title}")
-                
-                # 2. Details (Bold)
-                details = f"**⏱️ {subtitle}**"
-                if distance:
-                    details += f" &nbsp;•&nbsp; **📍 {distance}**"
-                
-                st.markdown(details, unsafe_allow_html=True)
-                
-                # 3. Green Badge
-                if is_green:
-                    st.markdown("🌿 <span style='color:#2e7d32; font-weight:bold;'>Fossil Free Delivery</span>", unsafe_allow_html=True)
-
-            # --- RIGHT: BUTTONS (Explicit Actions) ---
-            with c2:
-                # Add spacing to align buttons with text better
-                st.write("") 
-                
-                if " or Add " in display_text:
-                    pay_text, add_text = display_text.split(" or ")
-                    val_only = add_text.replace("Add ", "")
-                    
-                    # TOP-UP BUTTON: Very Explicit
-                    # Uses \n for line break to make it fit better if needed, or just clear text
-                    btn_label = f"➕ Add {val_only} SEK\nGet FREE Delivery"
-                    
-                    if st.button(btn_label, key=f"btn_add_{col_key}", use_container_width=True):
-                        submit_answer(f"{label_base}_TOPUP", scenario_id, context_label)
-                        st.rerun()
-                    
-                    # PAY BUTTON
-                    if st.button(f"Pay {pay_text}", key=f"btn_pay_{col_key}", use_container_width=True):
-                        submit_answer(f"{label_base}_PAID", scenario_id, context_label)
-                        st.rerun()
-
-                else:
-                    # STANDARD BUTTONS
-                    if "FREE" in display_text.upper():
-                        btn_label = f"✅ FREE Shipping" # Clear confirmation
-                        style_type = "secondary"
-                    else:
-                        btn_label = f"Pay {display_text}" # Explicit "Pay"
-                        style_type = "secondary"
-                    
-                    if st.button(btn_label, key=f"btn_std_{col_key}", type=style_type, use_container_width=True):
-                        submit_answer(f"{label_base}_FLAT", scenario_id, context_label)
-                        st.rerun()
-            
-            st.divider()
-
     # --- RENDER ROWS ---
+    # Standard Home, Express Home, Parcel Locker, Express Locker, Store Collect
+    for option in plan.options:
+        render_option_row(option, plan)
+
+# Low-widget screen: the HTML of the scenario (built once per cart) and one radio (plus Back),
+# so the number of elements per scenario stays small and constant
+@st.fragment
+def compact_panel():
+    q_idx = st.session_state.current_q
+    if q_idx >= len(df):
+        st.rerun()
+
+    plan = df.plan(q_idx, st.session_state.cart_offset)
+    screen = df.compact_screen(q_idx, st.session_state.cart_offset)
+    st.markdown(screen.html, unsafe_allow_html=True)
+    key = f"choice_{q_idx}"
+    st.radio("Your choice", list(screen.choices), format_func=screen.choices.get, index=None, key=key,
+             on_change=submit_choice, args=(key, plan))
+    if q_idx > 0:
+        st.button("⬅️ Back", on_click=go_back)
+
+if st.session_state.current_q >= len(df):
+    st.balloons()
+    st.success("✅ Survey Complete!")
+    st.write("Thank you for your participation.")
+    
+    results_df = pd.DataFrame(st.session_state.answers)
+    # st.dataframe(results_df) # Optional: Hide table if you don't want users to see it
+    
+    csv = results_df.to_csv(index=False).encode('utf-8')
+    st.download_button("Download My Responses", csv, "results.csv", "text/csv")
     
-    # 1. HOME STANDARD
-    render_option_row(
-        "Standard Home", "2-4 Days", home_disp, f"h_std_{q_idx}", 
-        "Home_Standard", row['Context_Label'], row['Scenario_ID'], 
-        is_green=home_is_green
-    )
-
-    # 2. HOME EXPRESS
-    render_option_row(
-        "Express Home", "Next Day", row['Home_Exp_Display'], f"h_exp_{q_idx}", 
-        "Home_Express", row['Context_Label'], row['Scenario_ID'], 
-        is_express=True
-    )
-
-    # 3. LOCKER STANDARD
-    locker_dist = row['Locker_Distance'] if 'Locker_Distance' in row else None
-    render_option_row(
-        "Parcel Locker", "2-4 Days", row['Locker_Display'], f"l_std_{q_idx}", 
-        "Locker_Standard", row['Context_Label'], row['Scenario_ID'], 
-        is_green=locker_is_green,
-        distance=locker_dist
-    )
-
-    # 4. LOCKER EXPRESS
-    render_option_row(
-        "Express Locker", "Next Day", row['Locker_Exp_Display'], f"l_exp_{q_idx}", 
-        "Locker_Express", row['Context_Label'], row['Scenario_ID'], 
-        is_express=True,
-        distance=locker_dist
-    )
-
-    # 5. STORE COLLECT
-    shop_dist = row['Shop_Distance'] if 'Shop_Distance' in row else None
-    render_option_row(
-        "Store Collect", "2-4 Days", row['Shop_Display'], f"s_col_{q_idx}", 
-        "Shop_Collect", row['Context_Label'], row['Scenario_ID'],
-        distance=shop_dist
-    )
+    if st.button("Restart"):
+        st.session_state.current_q = 0
+        st.session_state.answers = []
+        st.session_state.survey_started = False
+        st.session_state.cart_offset = None
+        st.rerun()
+elif st.session_state.render_mode == "buttons":
+    scenario_panel()
+elif st.session_state.render_mode == "compact":
+    compact_panel()
+else:
+    # The whole sequence goes to the browser once; it answers per basket or at the end
+    batch = checkout_scenarios(scenario_sequence(df, st.session_state.cart_offset),
+                               send=st.session_state.render_mode, answers=st.session_state.answers,
+                               key="checkout")
+    if batch is not None and batch["answers"] != st.session_state.answers:
+        st.session_state.answers = batch["answers"]
+        st.session_state.current_q = len(batch["answers"])
+        if batch["done"]:
+            st.rerun()
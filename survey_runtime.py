@@ -0,0 +1,403 @@
+"""
+Survey-side offer engine: offers computed live for each respondent's cart.
+
+The design CSV stores the display strings of one fixed cart per basket
+(Context_Cart_Value). With personalized carts every respondent gets their
+own cart per basket, Context_Cart_Value + an offset drawn once at the start,
+and the offers follow from the raw Price / Threshold columns with the same
+engine as the generator (design_engine.compute_offers). Offsets that would
+make a scenario break the logic filters are not used for that scenario.
+
+All (scenario, offset) combinations are computed in one vectorized pass
+the first time a design's personalized carts are used, so a click only
+looks up a tuple.
+
+The design itself is loaded once per server process into a DesignStore
+(immutable per-scenario records) held by a DesignRegistry; sessions keep
+only the content key of their design and their question number.
+
+Each scenario is compiled at load time into a ScenarioPlan (__slots__
+records with the parsed amounts, button labels, badges and answer labels),
+so drawing a screen does no string parsing and no pandas access. The plans
+of personalized carts are compiled the first time a respondent needs them.
+"""
+import hashlib
+import html
+import io
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from design_engine import (EXPRESS_NESTS, OFFER_NESTS, compute_offers, format_express_display, format_offer_display,
+                           logic_filter_mask)
+
+# --- 1. LIVE OFFERS ---
+
+# Possible cart offsets (SEK) around the basket of the design; one is drawn per respondent
+CART_OFFSETS = tuple(range(-50, 51, 10))
+
+# Columns the live offers are computed from
+RAW_OFFER_COLUMNS = [f"{nest}_{col}" for nest in OFFER_NESTS for col in ("Price", "Threshold")] + \
+                    [f"{nest}_Exp_Price" for nest in EXPRESS_NESTS]
+
+
+def has_raw_offers(design):
+    """True when the design carries the price / threshold columns live offers need."""
+    return all(col in design.columns for col in RAW_OFFER_COLUMNS + ["Context_Cart_Value"])
+
+
+class OfferTables:
+    """
+    Cart value and display strings of every scenario for every cart offset.
+
+        tables = OfferTables(design_df)
+        k = tables.draw_offset(rng)         # once per respondent
+        cart, displays = tables.lookup(q_idx, k)
+        displays["Home_Display"]            # e.g. "Pay 69 or Add 519"
+
+    An offset can push a cart across a free-shipping threshold into a
+    scenario the logic filters reject (e.g. Home and Locker both FREE). Per
+    scenario only the band of offsets around the design's own cart that
+    passes the filters is used; an offset outside it falls back to the
+    nearest one inside (self.bands holds the (first, last) offset number).
+    """
+
+    def __init__(self, design, offsets=CART_OFFSETS):
+        self.offsets = tuple(offsets)
+        base = design["Context_Cart_Value"].to_numpy(dtype=np.int64)
+        carts = np.maximum(base[:, None] + np.asarray(self.offsets, dtype=np.int64)[None, :], 0)
+        shape = carts.shape
+
+        columns, gaps = {}, {}
+        for nest in OFFER_NESTS:
+            price = design[f"{nest}_Price"].to_numpy(dtype=np.int64)[:, None]
+            threshold = design[f"{nest}_Threshold"].to_numpy(dtype=np.int64)[:, None]
+            final_cost, gaps[nest] = compute_offers(price, threshold, carts)
+            columns[f"{nest}_Display"] = format_offer_display(final_cost, gaps[nest]).reshape(shape)
+        for nest in EXPRESS_NESTS:
+            express = format_express_display(design[f"{nest}_Exp_Price"].to_numpy())
+            columns[f"{nest}_Exp_Display"] = np.repeat(express[:, None], shape[1], axis=1)
+
+        self.bands = _filter_bands(logic_filter_mask(gaps["Locker"], gaps["Home"], gaps["Shop"]), self.offsets)
+
+        # Plain Python tuples: a lookup is two tuple indexings, no NumPy scalar boxing
+        names = tuple(columns)
+        cells = {}
+        for s in range(shape[0]):
+            for k in range(shape[1]):
+                cells[s, k] = (int(carts[s, k]), dict(zip(names, (str(columns[name][s, k]) for name in names))))
+        self._rows = tuple(
+            tuple(cells[s, min(max(k, first), last)] for k in range(shape[1]))
+            for s, (first, last) in enumerate(self.bands)
+        )
+
+    def draw_offset(self, rng):
+        """Random offset number for one respondent (uniform over the offsets)."""
+        return int(rng.integers(len(self.offsets)))
+
+    def lookup(self, scenario, offset):
+        """(cart value, {display column: text}) of scenario number `scenario` (0-based)."""
+        return self._rows[scenario][offset]
+
+
+def _filter_bands(passes, offsets):
+    """
+    (first, last) offset number per scenario: the run of offsets that pass
+    the filters around the offset closest to 0. A scenario whose own cart
+    is rejected keeps that cart only.
+    """
+    center = int(np.argmin(np.abs(np.asarray(offsets))))
+    bands = []
+    for row in passes:
+        first = last = center
+        if row[center]:
+            while first > 0 and row[first - 1]:
+                first -= 1
+            while last < len(row) - 1 and row[last + 1]:
+                last += 1
+        bands.append((first, last))
+    return tuple(bands)
+
+
+# --- 2. SHARED READ-ONLY DESIGNS ---
+
+class DesignStore:
+    """
+    One design as a tuple of read-only scenario records. A record maps
+    column -> plain Python value (row['Home_Display'], 'Home_Is_Green' in row)
+    and cannot be changed, so every session can read the same object.
+    """
+
+    def __init__(self, design):
+        self.columns = tuple(design.columns)
+        self.rows = tuple(MappingProxyType(record) for record in design.to_dict("records"))
+        self.render_plans = compile_render_plans(self)
+        self._offset_plans = {}  # (q_idx, offset number) -> ScenarioPlan, compiled on first use
+        self._compact_screens = {}  # (q_idx, offset number) -> CompactScreen, built on first use
+        self._offer_tables = None  # OfferTables, built on first use (personalized carts only)
+        self._lock = threading.Lock()
+
+    @property
+    def offer_tables(self):
+        """OfferTables of the design, or None without the raw price / threshold columns."""
+        if self._offer_tables is None and has_raw_offers(self):
+            tables = OfferTables(pd.DataFrame.from_records([dict(row) for row in self.rows], columns=self.columns))
+            with self._lock:
+                if self._offer_tables is None:
+                    self._offer_tables = tables
+        return self._offer_tables
+
+    def plan(self, q_idx, offset=None):
+        """ScenarioPlan of scenario number `q_idx` for the design's cart or for cart offset number `offset`."""
+        if offset is None:
+            return self.render_plans[q_idx]
+        plan = self._offset_plans.get((q_idx, offset))
+        if plan is None:
+            plan = _scenario_plan(self.rows[q_idx], q_idx, *self.offer_tables.lookup(q_idx, offset))
+            with self._lock:
+                plan = self._offset_plans.setdefault((q_idx, offset), plan)
+        return plan
+
+    def compact_screen(self, q_idx, offset=None):
+        """CompactScreen of plan(q_idx, offset), built the first time it is drawn."""
+        screen = self._compact_screens.get((q_idx, offset))
+        if screen is None:
+            screen = CompactScreen(self.plan(q_idx, offset), q_idx, len(self.rows))
+            with self._lock:
+                screen = self._compact_screens.setdefault((q_idx, offset), screen)
+        return screen
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, q_idx):
+        return self.rows[q_idx]
+
+
+class DesignRegistry:
+    """
+    The designs loaded by any session of this server process, by content key
+    (SHA-256 of the CSV bytes). A design is parsed the first time its bytes
+    are seen; every later session with the same file just gets the key.
+
+    Only designs the app accepts are registered, and at most `max_designs`
+    are kept: the least recently used is dropped first (a session whose
+    design was dropped finds its key no longer `in` the registry).
+    """
+
+    def __init__(self, max_designs=16):
+        self.max_designs = max_designs
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load_csv(self, data, accept=None):
+        """
+        Key of the design in `data` (CSV bytes), or None if `accept(store)`
+        rejects it; parses it only the first time.
+        """
+        key = hashlib.sha256(data).hexdigest()
+        return self._add(key, lambda: pd.read_csv(io.BytesIO(data)), accept)
+
+    def load_frame(self, key, design, accept=None):
+        """Registers an in-memory design (e.g. demo data) under `key`; None if `accept(store)` rejects it."""
+        return self._add(key, lambda: design, accept)
+
+    def _add(self, key, load, accept):
+        with self._lock:
+            store = self._stores.get(key)
+        if store is None:
+            store = DesignStore(load())
+        # A rejected design (or one whose check raises) is never registered
+        if accept is not None and not accept(store):
+            return None
+        with self._lock:
+            self._stores.setdefault(key, store)
+            self._stores.move_to_end(key)
+            while len(self._stores) > self.max_designs:
+                self._stores.popitem(last=False)
+        return key
+
+    def __contains__(self, key):
+        return key in self._stores
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._stores.move_to_end(key)
+            return self._stores[key]
+
+
+# --- 3. RENDER PLANS ---
+
+# The five delivery options of a scenario, in screen order:
+# (title, subtitle, display column, widget key prefix, answer label base, green column, express, distance column)
+DELIVERY_OPTIONS = (
+    ("Standard Home", "2-4 Days", "Home_Display", "h_std", "Home_Standard", "Home_Is_Green", False, None),
+    ("Express Home", "Next Day", "Home_Exp_Display", "h_exp", "Home_Express", None, True, None),
+    ("Parcel Locker", "2-4 Days", "Locker_Display", "l_std", "Locker_Standard", "Locker_Is_Green", False,
+     "Locker_Distance"),
+    ("Express Locker", "Next Day", "Locker_Exp_Display", "l_exp", "Locker_Express", None, True, "Locker_Distance"),
+    ("Store Collect", "2-4 Days", "Shop_Display", "s_col", "Shop_Collect", None, False, "Shop_Distance"),
+)
+
+
+def is_true(value):
+    """Green flags arrive as booleans or as "TRUE" / "FALSE" text."""
+    return str(value).upper() == "TRUE"
+
+
+def clean_display_text(text, cart_value):
+    """Hides the top-up offer when the gap is more than 1.5x the cart ("Pay 69 or Add 559" -> "Pay 69")."""
+    if "Add" in str(text):
+        try:
+            parts = text.split("Add ")
+            gap = int(parts[1])
+            if gap > (cart_value * 1.5):
+                return text.split(" or")[0]
+        except (ValueError, IndexError):
+            pass
+    return text
+
+
+def _amount(text):
+    """SEK amount in "Pay 39" / "Add 59" / "FREE" (0), None when there is no number."""
+    if "FREE" in text.upper():
+        return 0
+    try:
+        return int(text.split()[-1])
+    except (ValueError, IndexError):
+        return None
+
+
+class OptionPlan:
+    """
+    One delivery option, ready to draw: texts, badges and its buttons as
+    (widget key, label, answer label, button type) tuples.
+    """
+    __slots__ = ("title", "subtitle", "is_express", "is_green", "distance", "pay_amount", "topup_amount", "buttons")
+
+    def __init__(self, spec, display_text, row, q_idx):
+        title, subtitle, _, key_prefix, label_base, green_col, is_express, distance_col = spec
+        self.title = title
+        self.subtitle = subtitle
+        self.is_express = is_express
+        self.is_green = green_col is not None and is_true(row.get(green_col))
+        distance = row.get(distance_col) if distance_col is not None else None
+        self.distance = None if distance is None or pd.isna(distance) or distance == "" else str(distance)
+
+        col_key = f"{key_prefix}_{q_idx}"
+        if " or Add " in display_text:
+            pay_text, add_text = display_text.split(" or ")
+            val_only = add_text.replace("Add ", "")
+            self.pay_amount, self.topup_amount = _amount(pay_text), _amount(val_only)
+            self.buttons = (
+                (f"btn_add_{col_key}", f"➕ Add {val_only} SEK\nGet FREE Delivery", f"{label_base}_TOPUP", "secondary"),
+                (f"btn_pay_{col_key}", f"Pay {pay_text}", f"{label_base}_PAID", "secondary"),
+            )
+        else:
+            self.pay_amount, self.topup_amount = _amount(display_text), None
+            btn_label = "✅ FREE Shipping" if "FREE" in display_text.upper() else f"Pay {display_text}"
+            self.buttons = ((f"btn_std_{col_key}", btn_label, f"{label_base}_FLAT", "secondary"),)
+
+
+# Inline styles of the low-widget screen (one st.markdown block per scenario)
+_CARD_STYLE = "display:flex; gap:12px; padding:10px 0; border-bottom:1px solid #e6e9ef;"
+_PILL_STYLE = ("display:inline-block; margin:2px 0; padding:4px 10px; border:1px solid #d1d5db; "
+               "border-radius:8px; white-space:pre-line;")
+
+
+def _option_html(option):
+    """HTML card of one option: title, delivery time, distance and green badges, and its offers."""
+    details = f"⏱️ {html.escape(option.subtitle)}"
+    if option.distance:
+        details += f" &nbsp;•&nbsp; 📍 {html.escape(option.distance)}"
+    green = ("<div>🌿 <span style='color:#2e7d32; font-weight:bold;'>Fossil Free Delivery</span></div>"
+             if option.is_green else "")
+    offers = "".join(f"<div><span style='{_PILL_STYLE}'>{html.escape(label)}</span></div>"
+                     for _, label, _, _ in option.buttons)
+    return (f"<div style='{_CARD_STYLE}'>"
+            f"<div style='flex:1.6;'><div style='font-size:1.15rem; font-weight:600;'>"
+            f"{'⚡ ' if option.is_express else ''}{html.escape(option.title)}</div>"
+            f"<div style='font-weight:700;'>{details}</div>{green}</div>"
+            f"<div style='flex:1;'>{offers}</div></div>")
+
+
+class ScenarioPlan:
+    """Everything one scenario screen shows: the cart, the answer fields and the five OptionPlans."""
+    __slots__ = ("scenario_id", "context_label", "cart_value", "options")
+
+    def __init__(self, scenario_id, context_label, cart_value, options):
+        self.scenario_id = scenario_id
+        self.context_label = context_label
+        self.cart_value = cart_value
+        self.options = options
+
+
+class CompactScreen:
+    """
+    The low-widget screen of one ScenarioPlan: the whole scenario as one
+    HTML block and the radio choices (answer label -> radio label).
+    Built only for render mode "compact" (DesignStore.compact_screen()).
+    """
+    __slots__ = ("html", "choices")
+
+    def __init__(self, plan, q_idx, n_scenarios):
+        cart_value, options = plan.cart_value, plan.options
+        self.html = (
+            f"<div style='color:#808495; font-size:0.9rem;'>Question {q_idx + 1} of {n_scenarios}</div>"
+            f"<div style='height:6px; border-radius:3px; background:#f0f2f6; margin:4px 0 12px;'>"
+            f"<div style='height:6px; border-radius:3px; background:#ff4b4b; width:{100 * q_idx / n_scenarios:.1f}%;'>"
+            f"</div></div>"
+            f"<div style='background-color:#f8f9fa; padding:15px; border-radius:10px; margin-bottom:12px; "
+            f"border: 1px solid #ddd;'><h3 style='margin:0; color:#333;'>🛒 Cart Total: <b>{cart_value} SEK</b></h3>"
+            f"<p style='margin:0; color:#666;'>Select your preferred delivery method below.</p></div>"
+            + "".join(_option_html(option) for option in options)
+        )
+        # Radio labels are one line: "➕ Add 59 SEK · Get FREE Delivery"
+        self.choices = MappingProxyType({answer: f"{option.title}: " + label.replace("\n", " · ")
+                                         for option in options for _, label, answer, _ in option.buttons})
+
+
+def _scenario_plan(row, q_idx, cart_value, displays):
+    """ScenarioPlan of one design row for one cart value and its display texts."""
+    texts = [str(displays[spec[2]]) for spec in DELIVERY_OPTIONS]
+    # Only the Standard Home offer hides large top-ups (as in the survey's original render code)
+    texts[0] = clean_display_text(texts[0], cart_value)
+    options = tuple(OptionPlan(spec, text, row, q_idx) for spec, text in zip(DELIVERY_OPTIONS, texts))
+    return ScenarioPlan(row.get("Scenario_ID"), row.get("Context_Label"), int(cart_value), options)
+
+
+def compile_render_plans(store):
+    """
+    ScenarioPlans of every scenario of a DesignStore for the design's own
+    cart (DesignStore.plan() compiles the cart offsets on first use).
+    Designs without display columns get None.
+    """
+    if not all(spec[2] in store.columns for spec in DELIVERY_OPTIONS) or "Context_Cart_Value" not in store.columns:
+        return None
+    return tuple(_scenario_plan(row, q_idx, row["Context_Cart_Value"], row)
+                 for q_idx, row in enumerate(store.rows))
+
+
+def scenario_sequence(store, offset=None):
+    """
+    A respondent's scenarios as JSON-ready dicts, for screens drawn in the
+    browser (the checkout component): the ScenarioPlans of the design's cart
+    or of cart offset number `offset`.
+    """
+    sequence = []
+    for q_idx in range(len(store)):
+        plan = store.plan(q_idx, offset)
+        sequence.append({
+            "scenario_id": plan.scenario_id,
+            "context_label": plan.context_label,
+            "cart_value": plan.cart_value,
+            "options": [{
+                "title": option.title, "subtitle": option.subtitle, "is_express": option.is_express,
+                "is_green": option.is_green, "distance": option.distance,
+                "buttons": [{"label": label, "answer": answer} for _, label, answer, _ in option.buttons],
+            } for option in plan.options],
+        })
+    return sequence